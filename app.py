@@ -1,15 +1,23 @@
-from flask import Flask, render_template, request, send_file
+from flask import Flask, Response, make_response, redirect, render_template, request, jsonify, stream_with_context, url_for
+from functools import wraps
+import base64
+import binascii
 import csv
+import hashlib
 import io
 import os
+import threading
 from dotenv import load_dotenv
 
 import psycopg2
 import psycopg2.extras
 
 # Import components
-from database import get_db_connection
+from database import get_db_connection, open_connection
 from auth_blueprint import auth_bp
+from result_cache import ResultCache
+from scoreboard_stream import ScoreboardBroadcaster
+import metrics
 
 # Load environment variables
 load_dotenv()
@@ -21,196 +29,530 @@ app.secret_key = os.getenv("FLASK_SECRET_KEY", os.urandom(24))
 # Register the authentication blueprint
 app.register_blueprint(auth_bp)
 
+# Scoreboard/leaderboard results are reused until the pipeline bumps data_version
+result_cache = ResultCache(
+    max_segments=int(os.getenv("RESULT_CACHE_SEGMENTS", 64)),
+    max_pages=int(os.getenv("RESULT_CACHE_PAGES", 256)),
+    version_ttl=float(os.getenv("RESULT_CACHE_VERSION_TTL", 15)),
+    enabled=os.getenv("RESULT_CACHE_ENABLED", "1") == "1"
+)
+
+# Seconds shared caches (the Azure front end, browsers) may reuse a response
+# before revalidating it; 0 makes them revalidate every time
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", 60))
+# Changes every ETag on deploy, so pages rendered by older code are not revalidated as current
+APP_VERSION = os.getenv("APP_VERSION", "")
+
+def conditional_on_data_version(view):
+    """
+    Tags a read-only view's responses with an ETag for the current data version
+    and answers a matching If-None-Match with 304 before the view runs, so no
+    scoring query is made. The version is the one result_cache already tracks.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        version = result_cache.data_version()
+        if version is None:
+            return view(*args, **kwargs)
+
+        key = f"{version}:{TIE_POLICY}:{FLAG_TIE_POLICY}:{APP_VERSION}:{request.full_path}"
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        cache_control = f"public, max-age={HTTP_CACHE_MAX_AGE}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    return wrapped
+
+
+# The hot read queries live at module level so migrate.py --check can EXPLAIN them
+# Segments with at least one effort, named from the pipeline's segment_metadata
+SEGMENTS_QUERY = """
+    SELECT m.segment_id, m.segment_name
+    FROM segment_metadata m
+    WHERE m.segment_name IS NOT NULL
+      AND EXISTS (SELECT 1 FROM athlete_segment_best b WHERE b.segment_id = m.segment_id)
+    ORDER BY m.segment_name
+"""
+
+# How athletes with identical best times are ranked on a segment:
+#   shared - they share the rank and the next rank is skipped (RANK)
+#   dense  - they share the rank and the next rank follows on (DENSE_RANK)
+#   strict - the earlier effort places first (ROW_NUMBER)
+# With N runners an athlete at rank r earns N - r + 1 points.
+TIE_POLICIES = {"shared": "RANK", "dense": "DENSE_RANK", "strict": "ROW_NUMBER"}
+TIE_POLICY = os.getenv("LEADERBOARD_TIE_POLICY", "shared")
+if TIE_POLICY not in TIE_POLICIES:
+    raise ValueError(f"LEADERBOARD_TIE_POLICY must be one of {', '.join(TIE_POLICIES)}, not {TIE_POLICY!r}")
+# Team scoring keeps its own policy so a leaderboard display choice never moves a flag;
+# strict is how ties were always broken for flags
+FLAG_TIE_POLICY = os.getenv("FLAG_TIE_POLICY", "strict")
+if FLAG_TIE_POLICY not in TIE_POLICIES:
+    raise ValueError(f"FLAG_TIE_POLICY must be one of {', '.join(TIE_POLICIES)}, not {FLAG_TIE_POLICY!r}")
+
+def rank_over(policy, prefix="", partition_by=None):
+    """
+    SQL window expression ranking athlete_segment_best rows under a tie policy.
+
+    Args:
+        policy (str): Key of TIE_POLICIES
+        prefix (str): Table alias with its dot, e.g. "b."
+        partition_by (str): Optional PARTITION BY expression
+    """
+    order = f"{prefix}best_time" + (f", {prefix}best_effort_id" if policy == "strict" else "")
+    partition = f"PARTITION BY {partition_by} " if partition_by else ""
+    return f"{TIE_POLICIES[policy]}() OVER ({partition}ORDER BY {order})"
+
+# athlete_segment_best holds each athlete's best effort, maintained by the pipeline
+BEST_EFFORTS_QUERY = f'''
+    SELECT athlete_name, segment_id, segment_name, best_time,
+           {rank_over(TIE_POLICY)} AS rank,
+           COUNT(*) OVER () - {rank_over(TIE_POLICY)} + 1 AS points
+    FROM athlete_segment_best
+    WHERE segment_id = %s
+    ORDER BY best_time ASC, best_effort_id
+'''
 
 def get_segments():
-    conn = get_db_connection()
     # RealDictCursor lets you access columns by name
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT DISTINCT segment_id, segment_name FROM segment_efforts ORDER BY segment_name")
-    segments = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(SEGMENTS_QUERY)
+        segments = cur.fetchall()
     return segments
 
 def get_best_efforts(segment_id):
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    query = '''
-        SELECT athlete_name, segment_id, segment_name, MIN(elapsed_time) as best_time
-        FROM segment_efforts
-        WHERE segment_id = %s
-        GROUP BY athlete_name, segment_id, segment_name
-        ORDER BY best_time ASC
-    '''
-    cur.execute(query, (segment_id,))
-    rows = cur.fetchall()
-
-    results = []
-    num_runners = len(rows)
-    for i, row in enumerate(rows):
-        points = num_runners - i
-        result = dict(row)
-        result['points'] = points
-        results.append(result)
-    
-    cur.close()
-    conn.close()
-    return results
+    """
+    Returns:
+        list: One dict per athlete, fastest first, with athlete_name, segment_id,
+        segment_name, best_time, rank and points under LEADERBOARD_TIE_POLICY
+    """
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(BEST_EFFORTS_QUERY, (segment_id,))
+        return [dict(row) for row in cur.fetchall()]
 
-def calculate_flags():
+# Keyset pages of a leaderboard. Each page seeks past the last row of the
+# previous one along idx_athlete_segment_best_ranking, so a deep page reads
+# no more rows than the first. The cursor carries that row's rank and
+# position, which is all the tie policy needs to rank the next page without
+# counting the rows before it, and the data version the page was read at, so
+# a walk across a pipeline commit is restarted instead of skipping or
+# repeating rows.
+LEADERBOARD_PAGE_SIZE = int(os.getenv("LEADERBOARD_PAGE_SIZE", 50))
+LEADERBOARD_MAX_PAGE_SIZE = 500
+
+PAGE_RANKS = {
+    "shared": "CASE WHEN best_time = %(after_time)s THEN %(after_rank)s ELSE %(after_pos)s + {rank} END",
+    "dense": ("CASE WHEN best_time = %(after_time)s THEN %(after_rank)s "
+              "ELSE %(after_rank)s + {rank} - CASE WHEN MIN(best_time) OVER () = %(after_time)s THEN 1 ELSE 0 END END"),
+    "strict": "%(after_pos)s + {rank}",
+}
+
+LEADERBOARD_COUNT_QUERY = "SELECT COUNT(*) AS total FROM athlete_segment_best WHERE segment_id = %s"
+
+def leaderboard_page_query(policy):
+    """Returns the keyset page query with ranks under the given tie policy."""
+    return f'''
+    SELECT ranked.*, %(total)s - ranked.rank + 1 AS points
+    FROM (
+        SELECT page.*, {PAGE_RANKS[policy].format(rank=rank_over(policy))} AS rank
+        FROM (
+            SELECT athlete_id, athlete_name, segment_id, segment_name, best_time, best_effort_id
+            FROM athlete_segment_best
+            WHERE segment_id = %(segment_id)s
+              AND (best_time, best_effort_id) > (%(after_time)s, %(after_effort_id)s)
+            ORDER BY best_time, best_effort_id
+            LIMIT %(limit)s
+        ) page
+    ) ranked
+    ORDER BY best_time, best_effort_id
+'''
+
+LEADERBOARD_PAGE_QUERY = leaderboard_page_query(TIE_POLICY)
+
+# Position before the first row: nothing placed yet, at any data version
+FIRST_PAGE = (None, -1, -1, 0, 0)
+
+class StaleCursorError(ValueError):
+    """The cursor was issued at an older data version; start again from the first page."""
+
+def encode_cursor(version, best_time, best_effort_id, rank, position):
+    raw = f"{version}:{best_time}:{best_effort_id}:{rank}:{position}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
     """
-    Calculates team flag totals by joining segment efforts with the athletes table
-    to determine team composition and performance on each segment.
+    Returns:
+        tuple: (data version, best_time, best_effort_id, rank, position) of the
+        last row on the previous page, or FIRST_PAGE for an empty cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
     """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    if not cursor:
+        return FIRST_PAGE
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        values = tuple(int(v) for v in raw.split(":"))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if len(values) != 5:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+def get_leaderboard_page(segment_id, cursor=None, limit=LEADERBOARD_PAGE_SIZE):
+    """
+    Reads one page of a segment's leaderboard.
+
+    Args:
+        segment_id (int): Segment to read
+        cursor (str): next_cursor of the previous page, or None for the first page
+        limit (int): Rows per page
+
+    Returns:
+        dict: efforts (rows as from get_best_efforts, plus athlete_id and
+        best_effort_id), total runners on the segment, and next_cursor (None on
+        the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+        StaleCursorError: If the leaderboard changed since the cursor was issued
+    """
+    cursor_version, after_time, after_effort_id, after_rank, after_pos = decode_cursor(cursor)
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute("SELECT version FROM data_version WHERE id = 1")
+        row = cur.fetchone()
+        version = row["version"] if row else 0
+        if cursor_version is not None and cursor_version != version:
+            raise StaleCursorError(f"Cursor is from data version {cursor_version}, now at {version}")
+        cur.execute(LEADERBOARD_COUNT_QUERY, (segment_id,))
+        total = cur.fetchone()["total"]
+        # One extra row tells whether there is a next page
+        cur.execute(LEADERBOARD_PAGE_QUERY, {
+            "segment_id": segment_id, "total": total, "limit": limit + 1,
+            "after_time": after_time, "after_effort_id": after_effort_id,
+            "after_rank": after_rank, "after_pos": after_pos,
+        })
+        efforts = [dict(row) for row in cur.fetchall()]
+
+    next_cursor = None
+    if len(efforts) > limit:
+        efforts = efforts[:limit]
+        last = efforts[-1]
+        next_cursor = encode_cursor(version, last["best_time"], last["best_effort_id"], last["rank"],
+                                    after_pos + limit)
+    return {"efforts": efforts, "total": total, "next_cursor": next_cursor}
+
+def page_size_arg():
+    """The ?limit= query argument, clamped to 1..LEADERBOARD_MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', LEADERBOARD_PAGE_SIZE, type=int)
+    return max(1, min(limit, LEADERBOARD_MAX_PAGE_SIZE))
+
+# Scores every owned segment in one pass. Results are ranked per segment with
+# window functions, summed per team, and the top team per segment is kept.
+#   - Standard segments use True Team Scoring on each athlete's best effort
+#     (athlete_segment_best), ranked under FLAG_TIE_POLICY among the athletes
+#     registered in athletes. Owner wins = DEFEND (1 flag), else CAPTURE (2).
+#   - Dub segments go to the team with the most efforts (2 flags).
+# Ties between teams go to the team that placed (or, for Dub, appeared) first.
+def flag_scoring_query(policy):
+    """Returns the flag scoring query with standard-segment points under the given tie policy."""
+    return f"""
+    WITH ranked AS (
+        SELECT
+            b.segment_id,
+            st.segment_name,
+            st.owner_team,
+            a.team_name,
+            COUNT(*) OVER (PARTITION BY b.segment_id)
+                - {rank_over(policy, "b.", "b.segment_id")} + 1 AS points,
+            ROW_NUMBER() OVER (PARTITION BY b.segment_id ORDER BY b.best_time, b.best_effort_id) AS finish_pos,
+            NULL::bigint AS arrival_pos
+        FROM
+            athlete_segment_best b
+        JOIN
+            athletes a ON b.athlete_id = a.athlete_id
+        JOIN
+            segment_teams st ON st.segment_id = b.segment_id
+        WHERE
+            st.owner_team NOT IN ('', 'Dub')
+        UNION ALL
+        SELECT
+            e.segment_id,
+            st.segment_name,
+            st.owner_team,
+            a.team_name,
+            NULL::bigint AS points,
+            NULL::bigint AS finish_pos,
+            ROW_NUMBER() OVER (PARTITION BY e.segment_id ORDER BY e.id) AS arrival_pos
+        FROM
+            segment_efforts e
+        JOIN
+            athletes a ON e.athlete_id = a.athlete_id
+        JOIN
+            segment_teams st ON st.segment_id = e.segment_id
+        WHERE
+            st.owner_team = 'Dub'
+    ),
+    team_scores AS (
+        SELECT
+            segment_id,
+            segment_name,
+            owner_team,
+            team_name,
+            CASE WHEN owner_team = 'Dub' THEN COUNT(*)
+                 ELSE SUM(points) END AS team_score,
+            CASE WHEN owner_team = 'Dub' THEN MIN(arrival_pos)
+                 ELSE MIN(finish_pos) END AS first_pos
+        FROM ranked
+        WHERE team_name <> ''
+        GROUP BY segment_id, segment_name, owner_team, team_name
+    ),
+    placed AS (
+        SELECT
+            team_scores.*,
+            ROW_NUMBER() OVER (PARTITION BY segment_id ORDER BY team_score DESC, first_pos) AS place
+        FROM team_scores
+    )
+    SELECT
+        segment_id,
+        segment_name,
+        owner_team,
+        team_name AS winning_team,
+        team_score,
+        CASE WHEN owner_team = 'Dub' THEN 2
+             WHEN team_name = owner_team THEN 1
+             ELSE 2 END AS flags_awarded
+    FROM placed
+    WHERE place = 1
+    ORDER BY segment_id
+"""
 
-    # Get the designated owner team for each segment from the 'segment_teams' table
-    cur.execute("SELECT segment_id, owner_team FROM segment_teams")
-    segment_owners = {row["segment_id"]: row["owner_team"] for row in cur.fetchall()}
+FLAG_SCORING_QUERY = flag_scoring_query(FLAG_TIE_POLICY)
 
-    # Get all unique segments that have at least one effort recorded
-    cur.execute("SELECT DISTINCT segment_id FROM segment_efforts")
-    segment_ids = [row["segment_id"] for row in cur.fetchall()]
+def calculate_segment_results():
+    """
+    Scores all segments with a single query: standard segments from each
+    athlete's best effort in athlete_segment_best, Dub segments from every
+    effort in segment_efforts, with teams from athletes and owners from
+    segment_teams.
+
+    Returns:
+        tuple: (flags, winners) where flags maps each team to its flag total and
+        winners lists one dict per scored segment with segment_id, segment_name,
+        owner_team, winning_team, team_score and flags_awarded
+    """
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(FLAG_SCORING_QUERY)
+        winners = [dict(row) for row in cur.fetchall()]
 
     # Initialize flag counts for each team
     flags = {"North": 0, "South": 0, "STP": 0}
+    for winner in winners:
+        if winner["winning_team"] in flags:
+            flags[winner["winning_team"]] += winner["flags_awarded"]
+    return flags, winners
 
-    # Process each segment individually
-    for segment_id in segment_ids:
-        owner_team = segment_owners.get(segment_id)
-        if not owner_team:
-            continue  # Skip this segment if it has no designated owner
-
-        # This single query now fetches all efforts for the segment AND joins with the
-        # 'athletes' table to get the team_name for each runner.
-        query = """
-            SELECT
-                e.elapsed_time,
-                a.team_name
-            FROM
-                segment_efforts e
-            JOIN
-                athletes a ON e.athlete_id = a.athlete_id
-            WHERE
-                e.segment_id = %s
-        """
-        cur.execute(query, (segment_id,))
-        all_efforts = cur.fetchall()
-
-        if not all_efforts:
-            continue
-
-        # Logic for "Dub" segments (awarded for most participants)
-        if owner_team == "Dub":
-            participation = {}
-            for effort in all_efforts:
-                team = effort["team_name"]
-                if team:  # Ensure the athlete has a team
-                    participation[team] = participation.get(team, 0) + 1
-            
-            if participation:
-                winning_team = max(participation, key=participation.get)
-                if winning_team in flags:
-                    flags[winning_team] += 2  # 2 flags for the win
-
-        # Logic for standard segments (awarded based on "True Team Scoring")
-        else:
-            sorted_efforts = sorted(all_efforts, key=lambda x: x["elapsed_time"])
-            num_runners = len(sorted_efforts)
-            team_points = {}
-
-            for i, effort in enumerate(sorted_efforts):
-                team = effort["team_name"]
-                if team:  # Ensure the athlete has a team
-                    points = num_runners - i
-                    team_points[team] = team_points.get(team, 0) + points
-            
-            if team_points:
-                winning_team = max(team_points, key=team_points.get)
-                if winning_team == owner_team:
-                    flags[winning_team] += 1  # 1 flag for a successful DEFEND
-                else:
-                    flags[winning_team] += 2  # 2 flags for a successful CAPTURE
-
-    conn.close()
+def calculate_flags():
+    """
+    Calculates team flag totals by joining segment efforts with the athletes table
+    to determine team composition and performance on each segment.
+    """
+    flags, _ = calculate_segment_results()
     return flags
 
+# Rows fetched per round trip by the server-side export cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+# Exports running at once in this process, each on its own connection; more get a 503
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", 2))
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+def iter_csv(headers, rows, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields CSV text in chunks of batch_size rows, starting with the header line
+    so the first byte goes out before any row has been read.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    yield buffer.getvalue()
+
+    pending = 0
+    for row in rows:
+        if pending == 0:
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow(row)
+        pending += 1
+        if pending == batch_size:
+            yield buffer.getvalue()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+# This query gets all efforts and sorts them correctly in one go
+EXPORT_ALL_EFFORTS_QUERY = """
+    SELECT athlete_id, athlete_name, segment_id, elapsed_time, start_date_local
+    FROM segment_efforts
+    ORDER BY segment_id, elapsed_time ASC;
+"""
+
+def csv_response(chunks, download_name):
+    """Streams CSV chunks as a file download."""
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={download_name}'}
+    )
+
 @app.route('/export/all_efforts')
+@conditional_on_data_version
 def export_all_efforts():
     """
     Exports a single CSV file containing all segment efforts,
     ordered by segment_id, then by elapsed_time.
-    """
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
-    # This query gets all efforts and sorts them correctly in one go
-    query = """
-        SELECT athlete_id, athlete_name, segment_id, elapsed_time, start_date_local
-        FROM segment_efforts
-        ORDER BY segment_id, elapsed_time ASC;
+    Rows are streamed from a server-side cursor, so memory use stays flat
+    however large segment_efforts grows. The cursor runs on a dedicated
+    connection outside the pool, so a slow download never holds a pool slot
+    that page requests are waiting for. Those connections are capped at
+    EXPORT_MAX_CONCURRENT; past that the export answers 503 instead of
+    opening another.
     """
-    cur.execute(query)
-    all_efforts = cur.fetchall()
-    cur.close()
-    conn.close()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
+    if not export_slots.acquire(blocking=False):
+        response = make_response("Too many exports are running, try again shortly.", 503)
+        response.headers['Retry-After'] = '30'
+        return response
 
     # Explicitly define headers to ensure correct column order
     headers = ['athlete_id', 'athlete_name', 'segment_id', 'elapsed_time', 'start_date_local']
-    writer.writerow(headers)
 
-    # Write data rows
-    if all_efforts:
-        for row in all_efforts:
-            writer.writerow([row[key] for key in headers])
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.read().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='all_segment_efforts.csv'
-    )
+    def generate():
+        conn = open_connection()
+        try:
+            with conn.cursor(name='export_all_efforts') as cur:
+                cur.itersize = EXPORT_BATCH_SIZE
+                cur.execute(EXPORT_ALL_EFFORTS_QUERY)
+                yield from iter_csv(headers, cur)
+        finally:
+            # Also runs when the client disconnects mid-download
+            conn.close()
+
+    try:
+        response = csv_response(generate(), 'all_segment_efforts.csv')
+    except Exception:
+        export_slots.release()
+        raise
+    # Released once the download ends or is abandoned, even if generate() never started
+    response.call_on_close(export_slots.release)
+    return response
 
 @app.route('/')
 def home():
     return render_template('home.html')
 
 @app.route('/leaderboard')
+@conditional_on_data_version
 def leaderboard():
-    segments = get_segments()
+    segments = result_cache.get_segments(get_segments)
     selected_id = request.args.get('segment_id')
-    best_efforts = [] # Initialize as empty list
+    cursor = request.args.get('cursor')
+    limit = page_size_arg()
+    page = None
     if selected_id:
         try:
-            # Only calculate if a segment is selected
-            best_efforts = get_best_efforts(int(selected_id))
+            # Only read a page if a segment is selected
+            segment_id = int(selected_id)
+            page = result_cache.get_leaderboard_page(
+                segment_id, cursor, limit, lambda: get_leaderboard_page(segment_id, cursor, limit))
+        except StaleCursorError:
+            # The standings changed since the previous page; start again from the top
+            result_cache.expire_version()
+            return redirect(url_for('leaderboard', segment_id=segment_id, limit=limit))
         except (ValueError, TypeError):
-            return "Invalid segment ID.", 400
-    return render_template('leaderboard.html', segments=segments, efforts=best_efforts, selected_id=selected_id)
+            return "Invalid segment ID or cursor.", 400
+    return render_template('leaderboard.html', segments=segments, selected_id=selected_id,
+                           efforts=page["efforts"] if page else [], page=page, cursor=cursor, limit=limit)
+
+@app.route('/api/leaderboard/<int:segment_id>')
+@conditional_on_data_version
+def api_leaderboard(segment_id):
+    """
+    One page of a segment's leaderboard as JSON. Pass the returned next_cursor
+    as ?cursor= to read the following page; ?limit= sets the page size. A
+    cursor issued before the pipeline's last commit gets a 409, and the walk
+    should start again without a cursor.
+    """
+    cursor = request.args.get('cursor')
+    limit = page_size_arg()
+    try:
+        page = result_cache.get_leaderboard_page(
+            segment_id, cursor, limit, lambda: get_leaderboard_page(segment_id, cursor, limit))
+    except StaleCursorError as e:
+        result_cache.expire_version()
+        return jsonify({"error": str(e), "restart": True}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "segment_id": segment_id,
+        "tie_policy": TIE_POLICY,
+        "total": page["total"],
+        "efforts": [{k: row[k] for k in ("rank", "points", "athlete_id", "athlete_name", "best_time", "segment_name")}
+                    for row in page["efforts"]],
+        "next_cursor": page["next_cursor"],
+    })
 
 # ... (Your /scoreboard and /export/leaderboard routes remain the same) ...
 @app.route('/scoreboard')
+@conditional_on_data_version
 def scoreboard():
-    flag_results = calculate_flags()
-    return render_template('scoreboard.html', flags=flag_results)
+    flag_results, segment_winners = result_cache.get_scoreboard(calculate_segment_results)
+    return render_template('scoreboard.html', flags=flag_results, winners=segment_winners)
+
+# Pushes the scoreboard to /scoreboard/stream clients whenever the pipeline commits
+scoreboard_broadcaster = ScoreboardBroadcaster(
+    calculate_segment_results,
+    heartbeat=float(os.getenv("SCOREBOARD_STREAM_HEARTBEAT", 15))
+)
+
+@app.route('/scoreboard/stream')
+def scoreboard_stream():
+    """
+    Server-Sent Events stream of scoreboard updates. Each event carries the
+    data version, flag totals and segment winners, and is sent once per
+    pipeline commit, scored once per worker however many clients listen.
+    """
+    return Response(
+        scoreboard_broadcaster.stream(),
+        mimetype='text/event-stream',
+        # Proxies must pass events through as they are written
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/export/leaderboard')
+@conditional_on_data_version
 def export_leaderboard():
     segment_id = request.args.get('segment_id')
     if not segment_id:
         return "No segment selected.", 400
-    results = get_best_efforts(int(segment_id))
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Athlete', 'Segment ID', 'Segment Name', 'Best Time', 'Points'])
-    for row in results:
-        writer.writerow([row['athlete_name'], row['segment_id'], row['segment_name'], row['best_time'], row['points']])
-    output.seek(0)
-    return send_file(io.BytesIO(output.read().encode()), mimetype='text/csv', as_attachment=True, download_name='leaderboard.csv')
+    segment_id = int(segment_id)
+    results = result_cache.get_leaderboard(segment_id, lambda: get_best_efforts(segment_id))
+    rows = ([row['athlete_name'], row['segment_id'], row['segment_name'], row['best_time'], row['points']]
+            for row in results)
+    headers = ['Athlete', 'Segment ID', 'Segment Name', 'Best Time', 'Points']
+    return csv_response(iter_csv(headers, rows), 'leaderboard.csv')
+
+# Route and query latency histograms, served at /metrics
+metrics.init_app(app, result_cache=result_cache, broadcaster=scoreboard_broadcaster)
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Hit/miss counters for tuning the result cache."""
+    return jsonify(result_cache.stats())
 
 if __name__ == '__main__':
     # Use the PORT environment variable if available, for services like Azure App Service
@@ -3,6 +3,8 @@ import requests
 import os
 import secrets
 from database import get_db_connection 
+from utils.rate_limiter import RateLimitExceeded
+from utils.strava_client import get_strava_client, STRAVA_OAUTH_BASE
 
 # Create a 'Blueprint' object
 auth_bp = Blueprint('auth_bp', __name__)
@@ -33,7 +35,8 @@ def index():
 def authorize():
     state = secrets.token_urlsafe(16)
     session['oauth_state'] = state
-    auth_url = (f"https://www.strava.com/oauth/authorize?"
+    oauth_base = os.getenv("STRAVA_OAUTH_BASE", STRAVA_OAUTH_BASE)
+    auth_url = (f"{oauth_base}/authorize?"
                 f"client_id={CLIENT_ID}&"
                 f"response_type=code&"
                 f"redirect_uri={REDIRECT_URI}&"
@@ -53,41 +56,33 @@ def callback():
         return "Authorization failed; no code provided.", 400
     
     # Exchange code for tokens
-    response = requests.post("https://www.strava.com/oauth/token", data={
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET,
-        'code': code,
-        'grant_type': 'authorization_code'
-    })
-    
-    if response.status_code != 200:
-        return f"Token exchange failed: {response.text}", 400
-    
-    tokens = response.json()
+    try:
+        tokens = get_strava_client(CLIENT_ID, CLIENT_SECRET).exchange_code(code)
+    except requests.HTTPError as e:
+        return f"Token exchange failed: {e.response.text}", 400
+    except requests.RequestException:
+        return "Token exchange failed: Strava could not be reached.", 502
+    except RateLimitExceeded:
+        return "Token exchange failed: Strava's rate limit is used up, try again later.", 503
     
     # Store credentials in the database
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        INSERT INTO credentials
-        (athlete_id, athlete_name, access_token, refresh_token, expires_at)
-        VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (athlete_id) DO UPDATE SET
-            athlete_name = EXCLUDED.athlete_name,
-            access_token = EXCLUDED.access_token,
-            refresh_token = EXCLUDED.refresh_token,
-            expires_at = EXCLUDED.expires_at
-    """, (
-        tokens['athlete']['id'],
-        f"{tokens['athlete']['firstname']} {tokens['athlete']['lastname']}",
-        tokens['access_token'],
-        tokens['refresh_token'],
-        tokens['expires_at']
-    ))
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO credentials
+            (athlete_id, athlete_name, access_token, refresh_token, expires_at)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (athlete_id) DO UPDATE SET
+                athlete_name = EXCLUDED.athlete_name,
+                access_token = EXCLUDED.access_token,
+                refresh_token = EXCLUDED.refresh_token,
+                expires_at = EXCLUDED.expires_at
+        """, (
+            tokens['athlete']['id'],
+            f"{tokens['athlete']['firstname']} {tokens['athlete']['lastname']}",
+            tokens['access_token'],
+            tokens['refresh_token'],
+            tokens['expires_at']
+        ))
+        conn.commit()
     
     return f"Success! {tokens['athlete']['firstname']} {tokens['athlete']['lastname']} has been authorized."
\ No newline at end of file
@@ -0,0 +1,263 @@
+# benchmark.py
+
+"""
+Scoring and leaderboard micro-benchmarks against synthetic data.
+
+Seeds an isolated schema (default cts_bench) in the configured Postgres with
+N athletes split across North/South/STP, M segments with segment_teams owners
+(every fourth one Dub) and up to K efforts per athlete per segment. It then
+times calculate_flags(), get_best_efforts(), get_segments() and the Flask
+routes through the test client, with the result cache disabled so every call
+reaches the database.
+
+Usage:
+    python benchmark.py --athletes 300 --segments 40 --efforts 3 --save-baseline bench.json
+    python benchmark.py --athletes 300 --segments 40 --efforts 3 --baseline bench.json
+
+The data is generated from --seed, so runs with the same arguments are
+comparable. Reports p50/p95 per case and, against a baseline, the p50 change.
+
+Seeding drops the schema first, so --schema must start with cts_bench unless
+--yes-drop is given.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+TEAMS = ["North", "South", "STP"]
+
+# Schemas the benchmark may drop without --yes-drop
+SCHEMA_PREFIX = "cts_bench"
+OWNERS = ["North", "South", "STP", "Dub"]
+
+
+def generate(athletes, segments, efforts, participation, seed):
+    """
+    Builds the synthetic rows.
+
+    Args:
+        athletes (int): Number of athletes, assigned to teams round-robin
+        segments (int): Number of segments, owners cycle North/South/STP/Dub
+        efforts (int): Maximum efforts per athlete on a segment they ran
+        participation (float): Chance an athlete ran a given segment at all
+        seed (int): Generator seed
+
+    Returns:
+        tuple: (athlete_rows, segment_rows, effort_rows) ready for execute_values
+    """
+    rng = random.Random(seed)
+    athlete_rows = [(1000 + i, f"Athlete {i}", TEAMS[i % len(TEAMS)]) for i in range(athletes)]
+    segment_rows = [(5000 + j, OWNERS[j % len(OWNERS)], f"Segment {j}") for j in range(segments)]
+
+    effort_rows = []
+    activity_id = 10_000_000
+    for athlete_id, athlete_name, _ in athlete_rows:
+        for segment_id, _, segment_name in segment_rows:
+            if rng.random() >= participation:
+                continue
+            base = rng.randint(120, 900)
+            for _ in range(rng.randint(1, efforts)):
+                activity_id += 1
+                effort_rows.append((athlete_name, athlete_id, segment_id, segment_name, activity_id,
+                                    base + rng.randint(0, 60), "2025-07-05T08:00:00Z"))
+    return athlete_rows, segment_rows, effort_rows
+
+
+def seed_schema(schema, athlete_rows, segment_rows, effort_rows, allow_any_schema=False):
+    """
+    Drops and recreates the benchmark schema with the migrations, then loads the synthetic rows.
+
+    Raises:
+        ValueError: If the schema name lacks SCHEMA_PREFIX and allow_any_schema is False
+    """
+    import psycopg2.extras
+    from psycopg2 import sql
+    from database import get_db_connection
+    from migrate import apply_migrations
+
+    if not schema.startswith(SCHEMA_PREFIX) and not allow_any_schema:
+        raise ValueError(f"Refusing to drop schema {schema!r}: benchmark schemas start with {SCHEMA_PREFIX}")
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(schema)))
+            cur.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(schema)))
+        conn.commit()
+        apply_migrations(conn)
+
+    import pipeline
+    logging.getLogger(pipeline.__name__).setLevel(logging.WARNING)
+
+    by_athlete = {}
+    for row in effort_rows:
+        by_athlete.setdefault(row[1], []).append(row)
+
+    with get_db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        psycopg2.extras.execute_values(
+            cur, "INSERT INTO athletes (athlete_id, athlete_name, team_name) VALUES %s", athlete_rows)
+        psycopg2.extras.execute_values(
+            cur, "INSERT INTO segment_teams (segment_id, owner_team, segment_name) VALUES %s", segment_rows)
+        # Efforts go through the pipeline's insert step so the derived tables are filled the same way
+        for athlete_id, rows in by_athlete.items():
+            pipeline.store_efforts(cur, athlete_id, rows[0][0], rows, None)
+        cur.execute("ANALYZE")
+        conn.commit()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_case(fn, repeat, warmup):
+    """
+    Runs fn warmup + repeat times.
+
+    Returns:
+        dict: p50, p95, mean and min in milliseconds over the timed runs
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "mean": statistics.fmean(samples),
+        "min": min(samples),
+    }
+
+
+def build_cases(segment_ids):
+    """Returns (name, callable) pairs; imports app only once the environment is set."""
+    import app as webapp
+
+    client = webapp.app.test_client()
+    # The busiest segment is the worst case for the per-segment queries
+    segment_id = segment_ids[0]
+
+    # Cursor of the last page, to check deep pages cost the same as the first
+    page = webapp.get_leaderboard_page(segment_id, limit=10)
+    last_cursor = None
+    while page["next_cursor"]:
+        last_cursor = page["next_cursor"]
+        page = webapp.get_leaderboard_page(segment_id, last_cursor, limit=10)
+
+    def get(path):
+        def run():
+            response = client.get(path)
+            response.get_data()
+            assert response.status_code == 200, f"{path} returned {response.status_code}"
+        return run
+
+    return [
+        ("calculate_flags", webapp.calculate_flags),
+        ("calculate_segment_results", webapp.calculate_segment_results),
+        ("get_best_efforts", lambda: webapp.get_best_efforts(segment_id)),
+        ("get_segments", webapp.get_segments),
+        ("get_leaderboard_page first", lambda: webapp.get_leaderboard_page(segment_id, limit=10)),
+        ("get_leaderboard_page last", lambda: webapp.get_leaderboard_page(segment_id, last_cursor, limit=10)),
+        ("GET /scoreboard", get("/scoreboard")),
+        ("GET /leaderboard", get(f"/leaderboard?segment_id={segment_id}")),
+        ("GET /api/leaderboard", get(f"/api/leaderboard/{segment_id}")),
+        ("GET /export/leaderboard", get(f"/export/leaderboard?segment_id={segment_id}")),
+        ("GET /export/all_efforts", get("/export/all_efforts")),
+    ]
+
+
+def report(results, baseline=None):
+    header = f"{'case':<28}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}"
+    if baseline:
+        header += f"{'base p50':>10}{'change':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        line = f"{name:<28}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['mean']:>10.2f}"
+        base = (baseline or {}).get(name)
+        if base:
+            change = (stats["p50"] - base["p50"]) / base["p50"] * 100 if base["p50"] else 0.0
+            line += f"{base['p50']:>10.2f}{change:>+8.1f}%"
+        elif baseline:
+            line += f"{'-':>10}{'-':>9}"
+        print(line)
+
+
+def vars_for_baseline(args):
+    """The arguments that decide the data set; baselines are only comparable if these match."""
+    return {k: getattr(args, k) for k in ("athletes", "segments", "efforts", "participation", "seed")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scoring and leaderboard queries")
+    parser.add_argument("--athletes", type=int, default=200)
+    parser.add_argument("--segments", type=int, default=30)
+    parser.add_argument("--efforts", type=int, default=3, help="max efforts per athlete per segment")
+    parser.add_argument("--participation", type=float, default=0.6,
+                        help="chance an athlete ran a given segment")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--schema", default=SCHEMA_PREFIX,
+                        help=f"schema to drop and seed; must start with {SCHEMA_PREFIX} unless --yes-drop is given")
+    parser.add_argument("--yes-drop", action="store_true", help="allow dropping a schema of any name")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in the schema")
+    parser.add_argument("--only", help="comma-separated case names to run")
+    parser.add_argument("--baseline", help="JSON file from an earlier --save-baseline to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results to a JSON file")
+    args = parser.parse_args()
+    if not args.no_seed and not args.schema.startswith(SCHEMA_PREFIX) and not args.yes_drop:
+        parser.error(f"--schema {args.schema} would be dropped; use a name starting with "
+                     f"{SCHEMA_PREFIX} or pass --yes-drop")
+
+    # Everything below runs in the benchmark schema; the cache would hide the queries
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema}"
+    os.environ["RESULT_CACHE_ENABLED"] = "0"
+
+    athlete_rows, segment_rows, effort_rows = generate(
+        args.athletes, args.segments, args.efforts, args.participation, args.seed)
+    if not args.no_seed:
+        start = time.perf_counter()
+        seed_schema(args.schema, athlete_rows, segment_rows, effort_rows, allow_any_schema=args.yes_drop)
+        print(f"Seeded {len(athlete_rows)} athletes, {len(segment_rows)} segments, "
+              f"{len(effort_rows)} efforts in {time.perf_counter() - start:.1f}s")
+
+    counts = {}
+    for row in effort_rows:
+        counts[row[2]] = counts.get(row[2], 0) + 1
+    busiest = sorted(counts, key=counts.get, reverse=True) or [segment_rows[0][0]]
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for name, fn in build_cases(busiest):
+        if only and name not in only:
+            continue
+        results[name] = time_case(fn, args.repeat, args.warmup)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved.get("params") != vars_for_baseline(args):
+            print(f"Warning: baseline was recorded with {saved.get('params')}", file=sys.stderr)
+        baseline = saved["results"]
+
+    report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"params": vars_for_baseline(args), "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+# fake_strava_server.py
+
+"""
+Local Strava API stand-in for offline pipeline runs and benchmarks.
+
+Serves the endpoints the pipeline uses, with deterministic synthetic athletes,
+activities and efforts on the configured segment IDs:
+
+    GET  /api/v3/athlete/activities   paginated summaries (no segment_efforts, like Strava)
+    GET  /api/v3/activities/<id>      activity detail with segment_efforts
+    GET  /api/v3/segments/<id>        segment metadata
+    POST /oauth/token                 authorization_code and refresh_token grants
+    GET  /oauth/authorize             redirects straight back with a code
+
+Every API response carries X-RateLimit-Limit / X-RateLimit-Usage headers for the
+15-minute and daily windows, requests over budget get a 429, and extra 429s and
+latency can be injected. Request counts are served at /fake/stats.
+
+--seed-db registers the athletes in a schema of their own (default cts_fake,
+created and migrated if missing), never in whatever schema the DB_* settings
+reach by default. Point the pipeline at it with PGOPTIONS.
+
+Usage:
+    python fake_strava_server.py --athletes 20 --latency-ms 80 --error-rate 0.02 --seed-db
+    PGOPTIONS="-c search_path=cts_fake" \\
+    STRAVA_API_BASE=http://127.0.0.1:8099/api/v3 \\
+    STRAVA_OAUTH_BASE=http://127.0.0.1:8099/oauth \\
+    CLIENT_ID=fake CLIENT_SECRET=fake python pipeline.py --backfill
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from flask import Flask, jsonify, redirect, request
+
+from pipeline import ALL_SEGMENT_IDS, TRACKING_START, TRACKING_END
+
+# --seed-db only writes to schemas with this prefix, so fake tokens never reach real data
+SCHEMA_PREFIX = "cts_fake"
+
+SHORT_WINDOW = 15 * 60
+DAILY_WINDOW = 24 * 60 * 60
+TOKEN_LIFETIME = 6 * 60 * 60
+
+# Segments the pipeline does not track, so some efforts get filtered out
+UNTRACKED_SEGMENT_IDS = [900000001, 900000002, 900000003]
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeStrava:
+    """
+    Synthetic Strava data and rate limit bookkeeping.
+
+    Args:
+        athletes (int): Number of synthetic athletes (IDs 1..athletes)
+        activities (int): Activities per athlete inside the tracking period
+        efforts (int): Maximum segment efforts per activity
+        segment_ids (list): Segment IDs efforts are generated on
+        seed (int): Seed for the generator; the same seed gives the same data
+    """
+
+    def __init__(self, athletes=10, activities=20, efforts=4, segment_ids=None, seed=2025,
+                 latency_ms=0, error_rate=0.0, limit_15min=200, limit_daily=2000):
+        self.athlete_ids = list(range(1, athletes + 1))
+        self.segment_ids = list(segment_ids or ALL_SEGMENT_IDS)
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.limits = (limit_15min, limit_daily)
+        self.calls = Counter()
+        self._usage = [0, 0]
+        self._windows = [None, None]
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+        self.activities = {}  # athlete_id -> [activity detail], oldest first
+        self.by_id = {}       # activity_id -> (athlete_id, activity detail)
+        for athlete_id in self.athlete_ids:
+            rng = random.Random(seed * 1000 + athlete_id)
+            starts = sorted(rng.randint(TRACKING_START, TRACKING_END - 3600) for _ in range(activities))
+            details = []
+            for n, start in enumerate(starts):
+                activity_id = athlete_id * 1_000_000 + n
+                segment_pool = self.segment_ids + UNTRACKED_SEGMENT_IDS
+                chosen = rng.sample(segment_pool, min(len(segment_pool), rng.randint(0, efforts)))
+                detail = {
+                    "id": activity_id,
+                    "name": f"Run {n + 1}",
+                    "type": "Run",
+                    "start_date": iso(start),
+                    "start_date_local": iso(start),
+                    "segment_efforts": [
+                        {
+                            "id": activity_id * 100 + k,
+                            "elapsed_time": rng.randint(60, 1200),
+                            "start_date_local": iso(start + 60 * k),
+                            "segment": {"id": sid, "name": f"Segment {sid}"},
+                        }
+                        for k, sid in enumerate(chosen)
+                    ],
+                }
+                details.append(detail)
+                self.by_id[activity_id] = (athlete_id, detail)
+            self.activities[athlete_id] = details
+
+    def charge(self):
+        """
+        Records one API call against both windows.
+
+        Returns:
+            tuple: (allowed, headers) where allowed is False if the call must get a 429
+        """
+        wall = time.time()
+        with self._lock:
+            for i, size in enumerate((SHORT_WINDOW, DAILY_WINDOW)):
+                window = int(wall // size)
+                if window != self._windows[i]:
+                    self._windows[i] = window
+                    self._usage[i] = 0
+            over = any(used >= limit for used, limit in zip(self._usage, self.limits))
+            if not over:
+                self._usage = [used + 1 for used in self._usage]
+            injected = self._random.random() < self.error_rate
+            headers = {
+                "X-RateLimit-Limit": ",".join(str(v) for v in self.limits),
+                "X-RateLimit-Usage": ",".join(str(v) for v in self._usage),
+            }
+        return not over and not injected, headers
+
+    def athlete_for(self, auth_header):
+        """Maps 'Bearer fake-token-<id>' back to the athlete ID, or None."""
+        token = (auth_header or "").replace("Bearer ", "", 1)
+        if not token.startswith("fake-token-"):
+            return None
+        try:
+            athlete_id = int(token.rsplit("-", 1)[1])
+        except ValueError:
+            return None
+        return athlete_id if athlete_id in self.activities else None
+
+    def tokens(self, athlete_id):
+        return {
+            "token_type": "Bearer",
+            "access_token": f"fake-token-{athlete_id}",
+            "refresh_token": f"fake-refresh-{athlete_id}",
+            "expires_at": int(time.time()) + TOKEN_LIFETIME,
+            "expires_in": TOKEN_LIFETIME,
+        }
+
+
+def create_app(fake):
+    app = Flask(__name__)
+
+    @app.before_request
+    def simulate_latency():
+        if fake.latency:
+            time.sleep(fake.latency * (0.5 + fake._random.random()))
+
+    def api_call(endpoint, handler):
+        fake.calls[endpoint] += 1
+        allowed, headers = fake.charge()
+        if not allowed:
+            fake.calls["429"] += 1
+            return jsonify({"message": "Rate Limit Exceeded"}), 429, headers
+        body, status = handler()
+        return jsonify(body), status, headers
+
+    @app.route("/api/v3/athlete/activities")
+    def list_activities():
+        def handler():
+            athlete_id = fake.athlete_for(request.headers.get("Authorization"))
+            if athlete_id is None:
+                return {"message": "Authorization Error"}, 401
+            after = request.args.get("after", type=int, default=0)
+            before = request.args.get("before", type=int, default=2 ** 31)
+            page = request.args.get("page", type=int, default=1)
+            per_page = request.args.get("per_page", type=int, default=30)
+            matching = [
+                {k: v for k, v in detail.items() if k != "segment_efforts"}
+                for detail in fake.activities[athlete_id]
+                if after < int(datetime.fromisoformat(detail["start_date"].replace("Z", "+00:00")).timestamp()) < before
+            ]
+            return matching[(page - 1) * per_page: page * per_page], 200
+        return api_call("activities", handler)
+
+    @app.route("/api/v3/activities/<int:activity_id>")
+    def activity_detail(activity_id):
+        def handler():
+            athlete_id = fake.athlete_for(request.headers.get("Authorization"))
+            owner = fake.by_id.get(activity_id)
+            if athlete_id is None or owner is None or owner[0] != athlete_id:
+                return {"message": "Record Not Found"}, 404
+            return owner[1], 200
+        return api_call("activity_detail", handler)
+
+    @app.route("/api/v3/segments/<int:segment_id>")
+    def segment(segment_id):
+        def handler():
+            if fake.athlete_for(request.headers.get("Authorization")) is None:
+                return {"message": "Authorization Error"}, 401
+            return {"id": segment_id, "name": f"Segment {segment_id}", "activity_type": "Run",
+                    "distance": 400.0 + segment_id % 1000}, 200
+        return api_call("segments", handler)
+
+    @app.route("/oauth/token", methods=["POST"])
+    def token():
+        def handler():
+            grant = request.form.get("grant_type")
+            if grant == "refresh_token":
+                value = request.form.get("refresh_token", "")
+            elif grant == "authorization_code":
+                value = request.form.get("code", "")
+            else:
+                return {"message": "Bad Request"}, 400
+            try:
+                athlete_id = int(value.rsplit("-", 1)[1])
+            except (IndexError, ValueError):
+                return {"message": "Bad Request"}, 400
+            if athlete_id not in fake.activities:
+                return {"message": "Bad Request"}, 400
+            body = fake.tokens(athlete_id)
+            if grant == "authorization_code":
+                body["athlete"] = {"id": athlete_id, "firstname": "Fake", "lastname": f"Athlete {athlete_id}"}
+            return body, 200
+        return api_call("token", handler)
+
+    @app.route("/oauth/authorize")
+    def authorize():
+        athlete_id = fake.athlete_ids[0]
+        return redirect(f"{request.args['redirect_uri']}?state={request.args.get('state', '')}"
+                        f"&code=fake-code-{athlete_id}&scope=read,activity:read_all")
+
+    @app.route("/fake/stats")
+    def stats():
+        return jsonify({"calls": dict(fake.calls), "usage": fake._usage, "limits": fake.limits})
+
+    return app
+
+
+def seed_database(fake, schema=SCHEMA_PREFIX):
+    """
+    Registers every synthetic athlete in credentials and athletes, with expired
+    tokens, in the given schema. The schema is created and migrated if needed,
+    and every later connection from this process uses it.
+
+    Raises:
+        ValueError: If the schema name lacks SCHEMA_PREFIX
+    """
+    if not schema.startswith(SCHEMA_PREFIX):
+        raise ValueError(f"Refusing to seed schema {schema!r}: fake schemas start with {SCHEMA_PREFIX}")
+    os.environ["PGOPTIONS"] = f"-c search_path={schema}"
+
+    from psycopg2 import sql
+    from database import get_db_connection
+    from migrate import apply_migrations
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema)))
+        conn.commit()
+        apply_migrations(conn)
+
+    teams = ["North", "South", "STP"]
+    with get_db_connection() as conn, conn.cursor() as cur:
+        for athlete_id in fake.athlete_ids:
+            name = f"Fake Athlete {athlete_id}"
+            cur.execute("""
+                INSERT INTO credentials (athlete_id, athlete_name, access_token, refresh_token, expires_at)
+                VALUES (%s, %s, %s, %s, 0)
+                ON CONFLICT (athlete_id) DO UPDATE SET
+                    access_token = EXCLUDED.access_token,
+                    refresh_token = EXCLUDED.refresh_token,
+                    expires_at = EXCLUDED.expires_at
+            """, (athlete_id, name, f"fake-token-{athlete_id}", f"fake-refresh-{athlete_id}"))
+            cur.execute("""
+                INSERT INTO athletes (athlete_id, athlete_name, team_name)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (athlete_id) DO NOTHING
+            """, (athlete_id, name, teams[athlete_id % len(teams)]))
+        conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Strava API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--athletes", type=int, default=10)
+    parser.add_argument("--activities", type=int, default=20, help="activities per athlete")
+    parser.add_argument("--efforts", type=int, default=4, help="max segment efforts per activity")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--latency-ms", type=float, default=0, help="mean added latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--limit-15min", type=int, default=200)
+    parser.add_argument("--limit-daily", type=int, default=2000)
+    parser.add_argument("--seed-db", action="store_true",
+                        help="register the synthetic athletes in --db-schema first")
+    parser.add_argument("--db-schema", default=SCHEMA_PREFIX,
+                        help=f"schema for --seed-db; must start with {SCHEMA_PREFIX}")
+    args = parser.parse_args()
+    if args.seed_db and not args.db_schema.startswith(SCHEMA_PREFIX):
+        parser.error(f"--db-schema {args.db_schema} is not a fake schema; use a name starting with {SCHEMA_PREFIX}")
+
+    fake = FakeStrava(athletes=args.athletes, activities=args.activities, efforts=args.efforts,
+                      seed=args.seed, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                      limit_15min=args.limit_15min, limit_daily=args.limit_daily)
+    if args.seed_db:
+        seed_database(fake, args.db_schema)
+        print(f'Seeded {len(fake.athlete_ids)} athletes; run the pipeline with PGOPTIONS="-c search_path={args.db_schema}"')
+    create_app(fake).run(host=args.host, port=args.port, threaded=True)
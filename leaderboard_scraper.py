@@ -0,0 +1,418 @@
+# leaderboard_scraper.py
+
+"""
+Club leaderboard scraper for the weekly tie-break sheet.
+
+Reads each segment's club leaderboard from strava.com (logged in with the
+cookies saved by python_selenium_step1.py), scores ties per team, and writes:
+
+    leaderboard_ties_scored.csv   one column per segment: tie points header, then names in finish order
+    raw_name_time_log.csv         every row read: Segment, Name, Date, Time
+
+Pages are fetched by a small worker pool, but requests to one host still start
+at least 2-7 s (random) apart, the same politeness budget as the old sequential
+script. The pool only overlaps that wait with response and parse time; it never
+sends requests to a host faster.
+
+Pages are cached on disk (default .scraper_cache/) with their ETag and
+Last-Modified headers. Later runs send conditional requests and reuse the
+cached page on a 304. --offline re-parses the cached pages without touching
+the network, for working on the scoring.
+
+Usage:
+    python leaderboard_scraper.py                        # every segment, default club
+    python leaderboard_scraper.py --team north,south --club-id 123456
+    python leaderboard_scraper.py --segments 1332276,1471907 --workers 2
+    python leaderboard_scraper.py --offline               # replay the last run from the cache
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlsplit
+
+import pandas as pd
+import requests
+from lxml import etree, html
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Segments grouped by team
+NORTH_SEGMENTS = [31546864, 20462981, 29510789, 39523134, 24861084, 13197134, 8378497, 39523117, 4732691, 15532025]
+SOUTH_SEGMENTS = [1471907, 1332276, 31142862, 39499332, 22972009, 9056731, 4824653, 1518106, 30471058, 26938538]
+STP_SEGMENTS = [39526612, 15898012, 17268802, 26192975, 26285065, 16403630, 24530544, 7080526, 22981622, 17314996]
+TEAM_SEGMENTS = {"north": NORTH_SEGMENTS, "south": SOUTH_SEGMENTS, "stp": STP_SEGMENTS}
+TEST_SEGMENT = [1332276]
+
+CLUB_ID = 123456
+SCORE_LIMIT = 100
+PAGE_SIZE = 25  # Strava uses pages of 25 entries
+
+LEADERBOARD_URL = "https://www.strava.com/segments/{segment_id}?page={page}&date_range={date_range}&filter=club&club_id={club_id}"
+
+TEAM_EMOJIS = ["🎩", "🧢", "⛑️"]
+
+# Display name -> name written to the sheet
+REPLACEMENT_MAP = {
+    # example
+    "Strava McRunner 🎩": "stmc"
+}
+
+# Rows containing any of these are left out of both outputs
+EXCLUDED_NAMES = ["Charlie Smith 🪖", "Dre Haus 🪖", "Henry Benson 🪖", "Yü Wu 🪖 ", "David Nuetzman 🪖 "]
+
+
+class HostThrottle:
+    """
+    Spaces out request starts per host.
+
+    Each call to wait() reserves the host's next slot and sleeps until it, so
+    concurrent callers queue up behind each other instead of all sending once
+    the delay has passed.
+
+    Args:
+        min_delay (float): Shortest gap in seconds between two requests to a host
+        max_delay (float): Longest gap; each gap is drawn uniformly in between
+    """
+
+    def __init__(self, min_delay=2.0, max_delay=7.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + random.uniform(self.min_delay, self.max_delay)
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class PageCache:
+    """
+    On-disk cache of leaderboard pages, one JSON file per URL.
+
+    Each entry keeps the body with the ETag and Last-Modified headers it was
+    served with, so the next fetch can be made conditional.
+
+    Args:
+        directory (str): Folder holding the entries; created on first write
+        offline (bool): Serve only from the cache and never send a request
+    """
+
+    def __init__(self, directory, offline=False):
+        self.directory = directory
+        self.offline = offline
+        self.stats = Counter()
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, url):
+        """
+        Returns:
+            dict: The cached entry (url, body, etag, last_modified, fetched_at) or None
+        """
+        try:
+            with open(self.path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("url") == url else None
+
+    def put(self, url, response):
+        """Stores a 200 response; the write is atomic so an interrupted run leaves no partial entry."""
+        entry = {
+            "url": url,
+            "body": response.text,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": int(time.time()),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def conditional_headers(entry):
+        """If-None-Match / If-Modified-Since headers for revalidating a cached entry."""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+
+def load_session(cookies_path, pool_size):
+    """
+    Returns:
+        requests.Session: Session carrying the saved Strava login cookies
+    """
+    with open(cookies_path, "r") as f:
+        cookies = json.load(f)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'])
+    return session
+
+
+def cell_text(cell):
+    """Cell text with each text node stripped, like BeautifulSoup's get_text(strip=True)."""
+    return "".join(text.strip() for text in cell.itertext())
+
+
+def parse_leaderboard(page_html):
+    """
+    Extracts the rows of the `div#results table` on a leaderboard page.
+
+    Returns:
+        list: (name, date, time) for each row with a full set of cells, or None
+        if the page has no results table
+        int: Number of rows in the table, to tell a full page from the last one
+    """
+    try:
+        doc = html.document_fromstring(page_html)
+    except (etree.ParserError, ValueError):
+        return None, 0
+    tables = doc.xpath('//div[@id="results"]//table')
+    if not tables:
+        return None, 0
+
+    rows = tables[0].xpath('.//tbody//tr')
+    parsed = []
+    for tr in rows:
+        tds = tr.xpath('.//td')
+        if len(tds) < 6:
+            continue
+        parsed.append((cell_text(tds[1]), cell_text(tds[2]), cell_text(tds[-1])))
+    return parsed, len(rows)
+
+
+def fetch_page(session, throttle, segment_id, page, club_id, date_range, cache=None):
+    """
+    Fetches and parses one leaderboard page.
+
+    With a cache, the request is conditional on the cached copy and a 304
+    re-parses that copy; in offline mode only the cache is read.
+
+    Returns:
+        tuple: (rows, row_count) as from parse_leaderboard; rows is None on a
+        non-200 response or a page missing from the offline cache
+    """
+    url = LEADERBOARD_URL.format(segment_id=segment_id, page=page, date_range=date_range, club_id=club_id)
+    cached = cache.get(url) if cache else None
+    if cache and cache.offline:
+        if cached is None:
+            cache.stats["missing"] += 1
+            logger.warning(f"Segment {segment_id} page {page} is not cached")
+            return None, 0
+        cache.stats["replayed"] += 1
+        return parse_leaderboard(cached["body"])
+
+    throttle.wait(url)
+    res = session.get(url, headers=PageCache.conditional_headers(cached), timeout=30)
+    if res.status_code == 304 and cached is not None:
+        cache.stats["not_modified"] += 1
+        return parse_leaderboard(cached["body"])
+    if res.status_code != 200:
+        logger.warning(f"Segment {segment_id} page {page} returned {res.status_code}")
+        return None, 0
+    if cache:
+        cache.stats["downloaded"] += 1
+        cache.put(url, res)
+    return parse_leaderboard(res.text)
+
+
+def fetch_leaderboards(session, throttle, segments, club_id, max_pages, workers, date_range="this_week",
+                       cache=None):
+    """
+    Fetches every segment's leaderboard with up to `workers` requests in flight.
+
+    Page 1 of every segment is queued up front; page n + 1 is only queued once
+    page n came back full, so no page is requested that the sequential scraper
+    would have skipped.
+
+    Returns:
+        dict: segment_id -> list of (name, date, time) rows in page order
+    """
+    pages = defaultdict(dict)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(fetch_page, session, throttle, segment_id, 1, club_id, date_range, cache):
+                (segment_id, 1)
+            for segment_id in segments
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                segment_id, page = pending.pop(future)
+                try:
+                    rows, row_count = future.result()
+                except requests.RequestException as e:
+                    logger.error(f"Segment {segment_id} page {page} failed: {e}")
+                    continue
+                if rows is None:
+                    continue
+                pages[segment_id][page] = rows
+                logger.info(f"Segment {segment_id} page {page}: {row_count} rows")
+                if row_count >= PAGE_SIZE and page < max_pages:
+                    future = executor.submit(fetch_page, session, throttle, segment_id, page + 1, club_id,
+                                             date_range, cache)
+                    pending[future] = (segment_id, page + 1)
+
+    leaderboards = {}
+    for segment_id in segments:
+        by_page = pages.get(segment_id, {})
+        rows = []
+        # Stop at the first missing page, as the sequential scraper did
+        page = 1
+        while page in by_page:
+            rows.extend(by_page[page])
+            page += 1
+        leaderboards[segment_id] = rows
+    return leaderboards
+
+
+def score_ties(entries):
+    """
+    Scores the tied times on one segment.
+
+    Within each group of equal times the first finisher scores nothing, the
+    second 1 point for their team, the third 2, and so on.
+
+    Args:
+        entries (list): (name, team_emoji, time) in finish order
+
+    Returns:
+        str: Header like "🎩-2\\n🧢-1", highest points first, or "" without ties
+    """
+    time_groups = defaultdict(list)
+    for idx, (name, emoji, time_val) in enumerate(entries):
+        time_groups[time_val].append((idx, name, emoji))
+
+    team_points = defaultdict(int)
+    for group in time_groups.values():
+        if len(group) > 1:
+            group.sort()
+            for rank_offset, (_, _, emoji) in enumerate(group[1:], start=1):
+                team_points[emoji] += rank_offset
+
+    if not team_points:
+        return ""
+    sorted_summary = sorted(team_points.items(), key=lambda x: -x[1])
+    return "\n".join(f"{emoji}-{pts}" for emoji, pts in sorted_summary)
+
+
+def build_outputs(leaderboards, replacement_map=None, excluded=EXCLUDED_NAMES):
+    """
+    Builds the two sheets from the scraped rows.
+
+    Returns:
+        pandas.DataFrame: Tie header row followed by the names per segment
+        pandas.DataFrame: Segment, Name, Date, Time for every row kept
+    """
+    replacement_map = REPLACEMENT_MAP if replacement_map is None else replacement_map
+    segment_name_lists = {}
+    tie_summary_per_segment = {}
+    raw_name_time_pairs = []
+
+    for segment_id, rows in leaderboards.items():
+        entries = []
+        for name_raw, date_val, time_val in rows:
+            emoji = next((symbol for symbol in TEAM_EMOJIS if symbol in name_raw), "")
+            if any(excluded_name in name_raw for excluded_name in excluded):
+                continue
+            raw_name_time_pairs.append({"Segment": segment_id, "Name": name_raw, "Date": date_val, "Time": time_val})
+            entries.append((replacement_map.get(name_raw, name_raw), emoji, time_val))
+
+        segment_name_lists[segment_id] = [name for name, _, _ in entries]
+        tie_summary_per_segment[segment_id] = score_ties(entries)
+
+    # Pad the name columns to one length
+    max_len = max((len(v) for v in segment_name_lists.values()), default=0)
+    for segment_id in segment_name_lists:
+        segment_name_lists[segment_id] += [None] * (max_len - len(segment_name_lists[segment_id]))
+
+    df = pd.DataFrame(segment_name_lists)
+    tie_row = pd.DataFrame([tie_summary_per_segment])
+    return pd.concat([tie_row, df], ignore_index=True), pd.DataFrame(raw_name_time_pairs)
+
+
+def parse_segments(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape club segment leaderboards and score ties")
+    parser.add_argument("--segments", type=parse_segments, help="comma-separated segment IDs")
+    parser.add_argument("--team", help="comma-separated teams whose segments to scrape (north, south, stp)")
+    parser.add_argument("--test", action="store_true", help="scrape only the test segment")
+    parser.add_argument("--club-id", type=int, default=CLUB_ID)
+    parser.add_argument("--date-range", default="this_week")
+    parser.add_argument("--score-limit", type=int, default=SCORE_LIMIT, help="leaderboard rows read per segment")
+    parser.add_argument("--workers", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--min-delay", type=float, default=2.0, help="shortest gap between requests to a host")
+    parser.add_argument("--max-delay", type=float, default=7.0, help="longest gap between requests to a host")
+    parser.add_argument("--cookies", default="strava_cookies.json", help="cookies saved by python_selenium_step1.py")
+    parser.add_argument("--cache-dir", default=".scraper_cache", help="where fetched pages are cached")
+    parser.add_argument("--no-cache", action="store_true", help="always download every page")
+    parser.add_argument("--offline", action="store_true", help="re-parse the cached pages without network access")
+    parser.add_argument("--leaderboard-out", default="leaderboard_ties_scored.csv")
+    parser.add_argument("--raw-out", default="raw_name_time_log.csv")
+    args = parser.parse_args(argv)
+
+    if args.test:
+        segments = TEST_SEGMENT
+    elif args.segments:
+        segments = args.segments
+    elif args.team:
+        try:
+            segments = [s for team in args.team.lower().split(",") for s in TEAM_SEGMENTS[team.strip()]]
+        except KeyError as e:
+            parser.error(f"unknown team {e}")
+    else:
+        segments = NORTH_SEGMENTS + SOUTH_SEGMENTS + STP_SEGMENTS
+    segments = list(dict.fromkeys(segments))
+
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the cache")
+    cache = None if args.no_cache else PageCache(args.cache_dir, offline=args.offline)
+    session = None if args.offline else load_session(args.cookies, args.workers)
+    throttle = HostThrottle(args.min_delay, args.max_delay)
+
+    start = time.monotonic()
+    leaderboards = fetch_leaderboards(session, throttle, segments, args.club_id,
+                                      max(1, args.score_limit // PAGE_SIZE), args.workers, args.date_range, cache)
+    logger.info(f"Scraped {len(segments)} segments in {time.monotonic() - start:.0f}s")
+    if cache:
+        logger.info(f"Page cache: {dict(cache.stats)}")
+
+    final_df, raw_df = build_outputs(leaderboards)
+    final_df.to_csv(args.leaderboard_out, index=False, encoding="utf-8-sig")
+    logger.info(f"Exported tie-scored leaderboard to {args.leaderboard_out}")
+    raw_df.to_csv(args.raw_out, index=False, encoding="utf-8-sig")
+    logger.info(f"Exported raw name-time log to {args.raw_out}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
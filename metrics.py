@@ -0,0 +1,253 @@
+# metrics.py
+
+"""
+Request and query timing for the web app, served in Prometheus text format.
+
+init_app() adds two hooks:
+  - Flask before/after_request handlers that time every request into a
+    latency histogram per route, method and status. Streamed responses
+    (the CSV exports, /scoreboard/stream) are timed until their headers are
+    ready, not until the last byte is sent.
+  - A psycopg2 connection factory for the database pool whose cursors time
+    every execute(), labelled with the app function that issued it
+    (get_segments, get_best_efforts, calculate_segment_results, ...).
+    Queries slower than SLOW_QUERY_MS are logged.
+
+Metrics are kept per process, so with several gunicorn workers each one
+reports its own share.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from flask import Response, g, request
+
+import database
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 500))
+
+# Seconds; covers a cached page (~1 ms) up to a full export
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with a fixed label set.
+
+    Args:
+        name (str): Metric name
+        help_text (str): HELP line
+        labelnames (tuple): Label names; observe() takes values in the same order
+        buckets (tuple): Upper bounds in seconds, ascending
+    """
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            for bound, count in zip(self.buckets, values):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Thread-safe counter with a fixed label set."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values)
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "cts_http_request_duration_seconds", "Time to build a response, by route.", ("method", "route", "status"))
+QUERY_LATENCY = Histogram(
+    "cts_db_query_duration_seconds", "Time in cursor.execute, by the app function that ran the query.",
+    ("function",))
+SLOW_QUERIES = Counter(
+    "cts_db_slow_queries_total", "Queries slower than SLOW_QUERY_MS, by the app function that ran them.",
+    ("function",))
+
+# Frames in these files are plumbing between the caller and the database
+_PLUMBING = (os.path.abspath(__file__), os.path.abspath(database.__file__), os.path.dirname(psycopg2.__file__))
+
+
+def calling_function():
+    """Name of the nearest function on the stack outside psycopg2, database.py and this module."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_PLUMBING) and not filename.endswith("contextlib.py"):
+            # e.g. "export_all_efforts.generate" for a nested function
+            return getattr(frame.f_code, "co_qualname", frame.f_code.co_name).replace(".<locals>", "")
+        frame = frame.f_back
+    return "unknown"
+
+
+def record_query(function, query, seconds):
+    QUERY_LATENCY.observe((function,), seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc((function,))
+        text = query.decode(errors="replace") if isinstance(query, bytes) else str(query)
+        logger.warning(f"Slow query in {function}: {seconds * 1000:.0f} ms: {' '.join(text.split())[:300]}")
+
+
+class TimedCursorMixin:
+    """Times execute()/executemany() on any psycopg2 cursor class it is mixed into."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(calling_function(), query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(calling_function(), query, time.perf_counter() - start)
+
+
+_timed_classes = {}
+_timed_classes_lock = threading.Lock()
+
+
+def timed_cursor_class(base):
+    """Returns (and caches) a subclass of the cursor class `base` with timing mixed in."""
+    with _timed_classes_lock:
+        cls = _timed_classes.get(base)
+        if cls is None:
+            cls = _timed_classes[base] = type(f"Timed{base.__name__}", (TimedCursorMixin, base), {})
+        return cls
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors, whatever cursor_factory the caller asks for, are timed."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _gauge(name, help_text, value, kind="gauge"):
+    if value is None:
+        return []
+    value = int(value) if isinstance(value, bool) else value
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def render(result_cache=None, broadcaster=None):
+    """
+    Returns:
+        str: Every metric in Prometheus text exposition format
+    """
+    lines = REQUEST_LATENCY.render() + QUERY_LATENCY.render() + SLOW_QUERIES.render()
+    if result_cache is not None:
+        stats = result_cache.stats()
+        lines += _gauge("cts_result_cache_hits_total", "Result cache hits.", stats["hits"], "counter")
+        lines += _gauge("cts_result_cache_misses_total", "Result cache misses.", stats["misses"], "counter")
+        lines += _gauge("cts_result_cache_evictions_total", "Leaderboards and pages evicted from the result cache.",
+                        stats["evictions"], "counter")
+        lines += _gauge("cts_result_cache_version_reads_total", "data_version reads by the result cache.",
+                        stats["version_reads"], "counter")
+        lines += _gauge("cts_result_cache_segments", "Leaderboards held in the result cache.",
+                        stats["cached_segments"])
+        lines += _gauge("cts_result_cache_pages", "Leaderboard pages held in the result cache.",
+                        stats["cached_pages"])
+        lines += _gauge("cts_result_cache_enabled", "1 if the result cache is on.", stats["enabled"])
+        lines += _gauge("cts_data_version", "Last data_version seen by this worker.", stats["data_version"])
+    if broadcaster is not None:
+        stats = broadcaster.stats()
+        lines += _gauge("cts_scoreboard_stream_subscribers", "Open /scoreboard/stream connections.",
+                        stats["subscribers"])
+        lines += _gauge("cts_scoreboard_stream_broadcasts_total", "Scoreboard updates pushed to subscribers.",
+                        stats["broadcasts"], "counter")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app, result_cache=None, broadcaster=None):
+    """
+    Times every request and every pooled query, and serves the results at /metrics.
+
+    Args:
+        app (Flask): The web app
+        result_cache (ResultCache): Optional; its counters are reported too
+        broadcaster (ScoreboardBroadcaster): Optional; its subscriber count is reported too
+    """
+    database.set_connection_factory(TimedConnection)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_LATENCY.observe((request.method, route, str(response.status_code)),
+                                    time.perf_counter() - started)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(result_cache, broadcaster), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,191 @@
+# migrate.py
+
+"""
+Versioned schema migrations.
+
+Each file in migrations/ named NNNN_description.sql is applied once, in order,
+in its own transaction, and recorded in schema_migrations. The scripts
+themselves are idempotent (IF NOT EXISTS), so a database that was created by
+hand from the README schema can be brought under the runner safely.
+
+Usage:
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied and pending migrations
+    python migrate.py --check    # EXPLAIN the app's hot queries and verify they use their indexes
+"""
+
+import argparse
+import logging
+import os
+import re
+import sys
+
+from database import get_db_connection
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_[\w-]+\.sql$")
+
+# Arbitrary key so two runners (e.g. two deploys) never apply the same script at once
+MIGRATION_LOCK_KEY = 20250701
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Returns:
+        list: (version, filename, path) tuples sorted by version
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((match.group(1), filename, os.path.join(directory, filename)))
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cur):
+    ensure_migrations_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def apply_migrations(conn, directory=MIGRATIONS_DIR):
+    """
+    Applies every pending migration, each in its own transaction.
+
+    Args:
+        conn: Open database connection
+        directory (str): Folder holding the NNNN_*.sql scripts
+
+    Returns:
+        list: Filenames that were applied
+    """
+    applied = []
+    for version, filename, path in list_migrations(directory):
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+            if version in applied_versions(cur):
+                conn.commit()
+                continue
+            with open(path) as f:
+                cur.execute(f.read())
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, filename))
+        conn.commit()
+        logging.info(f"Applied migration {filename}")
+        applied.append(filename)
+    return applied
+
+
+def hot_queries(cur):
+    """
+    The app's read queries with sample parameters, and the index each table
+    must be reached through (None accepts any index). Every listed table must
+    appear in the plan, so a query that stops reading the table meant to
+    serve it fails too.
+    """
+    from app import (SEGMENTS_QUERY, BEST_EFFORTS_QUERY, LEADERBOARD_PAGE_QUERY, EXPORT_ALL_EFFORTS_QUERY,
+                     FLAG_SCORING_QUERY)
+
+    cur.execute("SELECT segment_id FROM segment_efforts LIMIT 1")
+    row = cur.fetchone()
+    segment_id = row[0] if row else 0
+    return [
+        ("get_segments", SEGMENTS_QUERY, None,
+         {"segment_metadata": None, "athlete_segment_best": None}),
+        ("get_best_efforts", BEST_EFFORTS_QUERY, (segment_id,),
+         {"athlete_segment_best": "idx_athlete_segment_best_ranking"}),
+        ("get_leaderboard_page", LEADERBOARD_PAGE_QUERY,
+         {"segment_id": segment_id, "total": 0, "limit": 51, "after_time": 300, "after_effort_id": 0,
+          "after_rank": 0, "after_pos": 0},
+         {"athlete_segment_best": "idx_athlete_segment_best_ranking"}),
+        ("export_all_efforts", EXPORT_ALL_EFFORTS_QUERY, None,
+         {"segment_efforts": "idx_segment_efforts_segment_time"}),
+        ("calculate_flags", FLAG_SCORING_QUERY, None,
+         {"athlete_segment_best": None, "segment_efforts": "idx_segment_efforts_segment_time",
+          "athletes": None, "segment_teams": None}),
+    ]
+
+
+def plan_scans(plan):
+    """Yields (node_type, relation, index) for every scan node in an EXPLAIN (FORMAT JSON) plan."""
+    if "Relation Name" in plan:
+        index = plan.get("Index Name")
+        if index is None and plan["Node Type"] == "Bitmap Heap Scan":
+            # The index sits on the Bitmap Index Scan underneath
+            index = next((child.get("Index Name") for child in plan.get("Plans", [])
+                          if child.get("Index Name")), None)
+        yield plan["Node Type"], plan["Relation Name"], index
+    for child in plan.get("Plans", []):
+        yield from plan_scans(child)
+
+
+def check_query_plans(conn):
+    """
+    EXPLAINs each hot query with sequential scans disabled, so small test
+    tables plan like large ones, and checks each table is reached through
+    the index expected for it. A Seq Scan or a different index means the
+    index is missing or no longer matches the query.
+
+    Returns:
+        bool: True if every query passed
+    """
+    ok = True
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, query, params, indexed in hot_queries(cur):
+            cur.execute("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(";"), params)
+            plan = cur.fetchone()[0][0]["Plan"]
+            scans = list(plan_scans(plan))
+            missing = [
+                (node, rel) for node, rel, index in scans
+                if rel in indexed and (index is None or indexed[rel] not in (None, index))
+            ]
+            missing += [("not read", rel) for rel in indexed if rel not in {rel for _, rel, _ in scans}]
+            status = "FAIL" if missing else "ok"
+            ok = ok and not missing
+            detail = ", ".join(f"{rel}: {node}{f' ({index})' if index else ''}" for node, rel, index in scans)
+            detail += "".join(f", {rel}: not read" for node, rel in missing if node == "not read")
+            print(f"[{status}] {name}: {detail}")
+    conn.rollback()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check", action="store_true", help="verify the hot queries use their indexes")
+    args = parser.parse_args()
+
+    with get_db_connection() as conn:
+        if args.status:
+            with conn.cursor() as cur:
+                done = applied_versions(cur)
+            conn.commit()
+            for version, filename, _ in list_migrations():
+                print(f"{'applied' if version in done else 'pending'}  {filename}")
+            return 0
+        if args.check:
+            return 0 if check_query_plans(conn) else 1
+
+        applied = apply_migrations(conn)
+        if not applied:
+            logging.info("Database is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+-- Tables the app and pipeline expect, as documented in the README.
+-- Safe to run against an existing database: nothing is recreated.
+
+CREATE TABLE IF NOT EXISTS credentials (
+    athlete_id INTEGER PRIMARY KEY,
+    athlete_name TEXT NOT NULL,
+    access_token TEXT NOT NULL,
+    refresh_token TEXT NOT NULL,
+    expires_at INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS segment_efforts (
+    id SERIAL PRIMARY KEY,
+    athlete_name TEXT NOT NULL,
+    athlete_id INTEGER NOT NULL,
+    segment_id INTEGER NOT NULL,
+    segment_name TEXT NOT NULL,
+    activity_id BIGINT NOT NULL,
+    elapsed_time INTEGER NOT NULL,
+    start_date_local TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(athlete_id, segment_id, activity_id)
+);
+
+CREATE TABLE IF NOT EXISTS athletes (
+    athlete_id INTEGER PRIMARY KEY,
+    athlete_name TEXT NOT NULL,
+    team_name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS segment_teams (
+    segment_id INTEGER PRIMARY KEY,
+    owner_team TEXT NOT NULL,
+    segment_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS athlete_sync_state (
+    athlete_id INTEGER PRIMARY KEY,
+    last_activity_start BIGINT NOT NULL,
+    last_activity_id BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,15 @@
+-- Indexes for the web app's read queries.
+
+-- get_best_efforts (WHERE segment_id = ? ... MIN(elapsed_time)) and the
+-- all-efforts export (ORDER BY segment_id, elapsed_time). The INCLUDE columns
+-- let the leaderboard be answered from the index alone.
+CREATE INDEX IF NOT EXISTS idx_segment_efforts_segment_time
+    ON segment_efforts (segment_id, elapsed_time)
+    INCLUDE (athlete_id, athlete_name, segment_name);
+
+-- get_segments (SELECT DISTINCT segment_id, segment_name ... ORDER BY segment_name)
+CREATE INDEX IF NOT EXISTS idx_segment_efforts_segment_name
+    ON segment_efforts (segment_name, segment_id);
+
+-- The scoring query reads every effort once and joins athletes and
+-- segment_teams on their primary keys, so it needs nothing extra.
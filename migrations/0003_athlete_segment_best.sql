@@ -0,0 +1,39 @@
+-- One row per athlete and segment with their best effort, kept up to date by
+-- the pipeline as it inserts efforts. Leaderboards and standard-segment
+-- scoring read this instead of aggregating every raw effort.
+
+CREATE TABLE IF NOT EXISTS athlete_segment_best (
+    athlete_id INTEGER NOT NULL,
+    segment_id INTEGER NOT NULL,
+    athlete_name TEXT NOT NULL,
+    segment_name TEXT NOT NULL,
+    best_time INTEGER NOT NULL,
+    best_activity_id BIGINT NOT NULL,
+    best_effort_id INTEGER NOT NULL,  -- segment_efforts.id, breaks ties on time
+    effort_count INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (athlete_id, segment_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_athlete_segment_best_ranking
+    ON athlete_segment_best (segment_id, best_time, best_effort_id)
+    INCLUDE (athlete_id, athlete_name, segment_name);
+
+-- Backfill from the efforts already stored; rerunning recomputes every row
+INSERT INTO athlete_segment_best
+    (athlete_id, segment_id, athlete_name, segment_name,
+     best_time, best_activity_id, best_effort_id, effort_count)
+SELECT DISTINCT ON (athlete_id, segment_id)
+    athlete_id, segment_id, athlete_name, segment_name,
+    elapsed_time, activity_id, id,
+    COUNT(*) OVER (PARTITION BY athlete_id, segment_id)
+FROM segment_efforts
+ORDER BY athlete_id, segment_id, elapsed_time, id
+ON CONFLICT (athlete_id, segment_id) DO UPDATE SET
+    athlete_name = EXCLUDED.athlete_name,
+    segment_name = EXCLUDED.segment_name,
+    best_time = EXCLUDED.best_time,
+    best_activity_id = EXCLUDED.best_activity_id,
+    best_effort_id = EXCLUDED.best_effort_id,
+    effort_count = EXCLUDED.effort_count,
+    updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,24 @@
+-- Segment metadata fetched from Strava, kept across pipeline runs. Rows expire
+-- after SEGMENT_METADATA_TTL (success) or SEGMENT_METADATA_RETRY (failure,
+-- last_error set) and are refreshed by the pipeline's warm-up step.
+
+CREATE TABLE IF NOT EXISTS segment_metadata (
+    segment_id INTEGER PRIMARY KEY,
+    segment_name TEXT,
+    activity_type TEXT,
+    distance DOUBLE PRECISION,
+    data JSONB,
+    fetched_at TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    last_error TEXT
+);
+
+-- Seed names from the efforts already stored; expired so the next run fetches them
+INSERT INTO segment_metadata (segment_id, segment_name, expires_at)
+SELECT DISTINCT ON (segment_id) segment_id, segment_name, CURRENT_TIMESTAMP
+FROM athlete_segment_best
+ORDER BY segment_id, updated_at DESC
+ON CONFLICT (segment_id) DO NOTHING;
+
+-- get_segments now reads segment_metadata instead of SELECT DISTINCT over efforts
+DROP INDEX IF EXISTS idx_segment_efforts_segment_name;
@@ -0,0 +1,18 @@
+-- Every activity the pipeline has fully processed, including ones with no
+-- tracked efforts. Incremental runs skip the detail fetch for these.
+
+CREATE TABLE IF NOT EXISTS processed_activities (
+    athlete_id INTEGER NOT NULL,
+    activity_id BIGINT NOT NULL,
+    start_ts BIGINT,               -- Unix start time; NULL for rows backfilled from efforts
+    tracked_efforts INTEGER NOT NULL,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (athlete_id, activity_id)
+);
+
+-- Activities with stored efforts are known to be processed already
+INSERT INTO processed_activities (athlete_id, activity_id, tracked_efforts)
+SELECT athlete_id, activity_id, COUNT(*)
+FROM segment_efforts
+GROUP BY athlete_id, activity_id
+ON CONFLICT (athlete_id, activity_id) DO NOTHING;
@@ -0,0 +1,20 @@
+-- Challenge segments and the window (Unix seconds, start inclusive, end
+-- exclusive) in which their efforts count. Compared against the activity's
+-- start_date_local, as before. Add rows here instead of editing the pipeline.
+
+CREATE TABLE IF NOT EXISTS challenge_windows (
+    id SERIAL PRIMARY KEY,
+    segment_id INTEGER NOT NULL,
+    starts_at BIGINT NOT NULL,
+    ends_at BIGINT NOT NULL,
+    name TEXT,
+    CHECK (ends_at > starts_at),
+    UNIQUE (segment_id, starts_at, ends_at)
+);
+
+-- The three daily challenges that used to be hard-coded in the pipeline
+INSERT INTO challenge_windows (segment_id, starts_at, ends_at, name) VALUES
+    (37250565, 1751864400, 1751950800, 'Challenge 1'),
+    (39505193, 1751950800, 1752037200, 'Challenge 2'),
+    (37433791, 1752037200, 1752123600, 'Challenge 3')
+ON CONFLICT (segment_id, starts_at, ends_at) DO NOTHING;
@@ -0,0 +1,24 @@
+-- Run checkpoints. Each athlete is committed on its own and recorded in
+-- pipeline_run_athletes; a run that did not complete (timed out, crashed) is
+-- resumed by the next invocation, which skips the athletes already done.
+
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    run_id SERIAL PRIMARY KEY,
+    full_backfill BOOLEAN NOT NULL DEFAULT FALSE,
+    status TEXT NOT NULL DEFAULT 'running',  -- running | failed | completed
+    resumes INTEGER NOT NULL DEFAULT 0,
+    efforts_inserted INTEGER NOT NULL DEFAULT 0,
+    efforts_skipped INTEGER NOT NULL DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run_athletes (
+    run_id INTEGER NOT NULL REFERENCES pipeline_runs (run_id) ON DELETE CASCADE,
+    athlete_id INTEGER NOT NULL,
+    status TEXT NOT NULL,  -- done | failed
+    inserted INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, athlete_id)
+);
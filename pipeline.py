@@ -7,17 +7,21 @@ Fetches segment efforts from Strava API for configured segments and stores them
 Handles token refresh, rate limiting, and batch database operations.
 """
 
+import argparse
 import psycopg2
 import psycopg2.extras
 import requests
 from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import os
 import logging
 
-from database import get_db_connection
-from utils.strava_utils import refresh_access_token
+from database import get_db_connection, close_pool, bump_data_version
+from utils.challenges import ChallengeIndex
+from utils.rate_limiter import RateLimitExceeded
+from utils.strava_client import get_strava_client
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,16 +32,31 @@ NORTH_SEGMENT_IDS = [31546864, 20462981, 29510789, 39523134, 24861084, 13197134,
 SOUTH_SEGMENT_IDS = [1471907, 1332276, 31142862, 39499332, 22972009, 654778, 4824653, 1518106, 30471058, 26938538]
 STP_SEGMENT_IDS = [39526612, 15898012, 17268802, 26192975, 26285065, 16403630, 24530544, 7080526, 22981622, 17314996]
 
-# Challenge segments with time windows
-CHALLENGE_SEGMENT_ONE = [37250565]  # valid from 1751864400 to 1751950800
-CHALLENGE_SEGMENT_TWO = [39505193]  # valid from 1751950800 to 1752037200
-CHALLENGE_SEGMENT_THREE = [37433791] # valid from 1752037200 to 1752123600
-
-ALL_SEGMENT_IDS = NORTH_SEGMENT_IDS + SOUTH_SEGMENT_IDS + STP_SEGMENT_IDS + CHALLENGE_SEGMENT_ONE + CHALLENGE_SEGMENT_TWO + CHALLENGE_SEGMENT_THREE
+# Segments tracked for the whole competition. Challenge segments and their time
+# windows live in the challenge_windows table (see load_challenge_index).
+ALL_SEGMENT_IDS = NORTH_SEGMENT_IDS + SOUTH_SEGMENT_IDS + STP_SEGMENT_IDS
 TEST_SEGMENT = [1332276]
 
-# Segment cache to avoid repeated API calls
-segment_cache = {}
+# Tracking period for activity fetches
+TRACKING_START = 1751418832  # Use this for testing; tracking really starts at 1751864400
+TRACKING_END = 1752454800  # End of tracking period
+
+# Seconds re-fetched behind each athlete's high-water mark to pick up edited activities
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", 2 * 24 * 3600))
+
+# Rows per multi-row INSERT statement when storing efforts
+INSERT_PAGE_SIZE = int(os.getenv("INSERT_PAGE_SIZE", 1000))
+
+# Segment metadata is refreshed from Strava after SEGMENT_METADATA_TTL seconds;
+# failed lookups are retried after SEGMENT_METADATA_RETRY instead of sticking
+SEGMENT_METADATA_TTL = int(os.getenv("SEGMENT_METADATA_TTL", 7 * 24 * 3600))
+SEGMENT_METADATA_RETRY = int(os.getenv("SEGMENT_METADATA_RETRY", 600))
+
+# Tokens expiring within this many seconds are refreshed before any fetching starts
+TOKEN_REFRESH_HORIZON = int(os.getenv("TOKEN_REFRESH_HORIZON", 3600))
+
+# An unfinished run younger than this many seconds is resumed instead of starting over (0 disables)
+PIPELINE_RESUME_WINDOW = int(os.getenv("PIPELINE_RESUME_WINDOW", 6 * 3600))
 
 # def get_db_connection():
 #     """Get PostgreSQL database connection"""
@@ -51,100 +70,261 @@ segment_cache = {}
 #         sslmode='require'
 #     )
 
-def get_valid_challenge_segments(timestamp):
+def load_challenge_index(cur, base_segment_ids):
     """
-    Returns challenge segments valid for the given timestamp.
+    Builds the interval index of challenge windows from the challenge_windows table.
     
     Args:
-        timestamp (int): Unix timestamp to check
+        cur: Database cursor (RealDictCursor)
+        base_segment_ids (list): Segments tracked at all times
         
     Returns:
-        list: Valid challenge segment IDs
+        ChallengeIndex: Lookup of tracked segments by activity timestamp
     """
-    valid_segments = []
+    cur.execute("SELECT segment_id, starts_at, ends_at FROM challenge_windows")
+    windows = [(row["segment_id"], row["starts_at"], row["ends_at"]) for row in cur.fetchall()]
+    logger.info(f"Loaded {len(windows)} challenge windows")
+    return ChallengeIndex(base_segment_ids, windows)
+
+def fetch_segment_metadata(client, token, segment_id):
+    """
+    Fetches one segment's metadata from Strava. Safe to call from worker threads.
     
-    if 1751864400 <= timestamp < 1751950800:
-        valid_segments.extend(CHALLENGE_SEGMENT_ONE)
-    if 1751950800 <= timestamp < 1752037200:
-        valid_segments.extend(CHALLENGE_SEGMENT_TWO)
-    if 1752037200 <= timestamp < 1752123600:
-        valid_segments.extend(CHALLENGE_SEGMENT_THREE)
+    Returns:
+        tuple: (metadata, error) where exactly one is None
+    """
+    try:
+        return client.get_segment(token, segment_id), None
+    except (requests.RequestException, RateLimitExceeded) as e:
+        logger.error(f"Error fetching segment {segment_id}: {e}")
+        return None, str(e)
+
+def load_segment_metadata(cur, segment_ids):
+    """
+    Reads unexpired segment_metadata rows.
+    
+    Args:
+        cur: Database cursor (RealDictCursor)
+        segment_ids (list): Segment IDs to look up
         
-    return valid_segments
+    Returns:
+        dict: segment_id -> (expires_at, metadata), metadata None for a recent failure
+    """
+    cur.execute("""
+        SELECT segment_id, data, last_error, EXTRACT(EPOCH FROM expires_at) AS expires_at
+        FROM segment_metadata
+        WHERE segment_id = ANY(%s) AND expires_at > CURRENT_TIMESTAMP
+    """, (list(segment_ids),))
+    return {
+        row["segment_id"]: (float(row["expires_at"]), None if row["last_error"] else row["data"])
+        for row in cur.fetchall()
+    }
+
+def save_segment_metadata(cur, segment_id, metadata, error=None):
+    """
+    Stores a lookup result. Successes are kept for SEGMENT_METADATA_TTL; failures
+    only for SEGMENT_METADATA_RETRY, and keep whatever was stored before.
+    
+    Returns:
+        float: Unix time the entry expires
+    """
+    ttl = SEGMENT_METADATA_RETRY if error else SEGMENT_METADATA_TTL
+    metadata = metadata or {}
+    cur.execute("""
+        INSERT INTO segment_metadata AS m
+            (segment_id, segment_name, activity_type, distance, data, fetched_at, expires_at, last_error)
+        VALUES (%s, %s, %s, %s, %s,
+                CASE WHEN %s IS NULL THEN CURRENT_TIMESTAMP END,
+                CURRENT_TIMESTAMP + make_interval(secs => %s), %s)
+        ON CONFLICT (segment_id) DO UPDATE SET
+            segment_name = COALESCE(EXCLUDED.segment_name, m.segment_name),
+            activity_type = COALESCE(EXCLUDED.activity_type, m.activity_type),
+            distance = COALESCE(EXCLUDED.distance, m.distance),
+            data = COALESCE(EXCLUDED.data, m.data),
+            fetched_at = COALESCE(EXCLUDED.fetched_at, m.fetched_at),
+            expires_at = EXCLUDED.expires_at,
+            last_error = EXCLUDED.last_error
+    """, (segment_id, metadata.get("name"), metadata.get("activity_type"), metadata.get("distance"),
+          psycopg2.extras.Json(metadata) if metadata else None, error, ttl, error))
+    return time.time() + ttl
 
-def get_segment_info(segment_id, headers):
+def warm_segment_metadata(cur, client, token, segment_ids, workers=1):
     """
-    Cache segment metadata to avoid repeated lookups.
+    Fetches metadata for every segment that is missing or expired in
+    segment_metadata, so each segment costs one API call per TTL.
     
     Args:
-        segment_id (int): Strava segment ID
-        headers (dict): HTTP headers with auth token
+        cur: Database cursor (RealDictCursor); only this thread writes
+        client (StravaClient): Strava API client
+        token (str): Any valid access token
+        segment_ids (list): Segments to warm
+        workers (int): Concurrent lookups
         
     Returns:
-        dict: Segment metadata or None if failed
+        int: Segments whose name was added or changed, i.e. what the app shows differs
     """
-    if segment_id not in segment_cache:
-        try:
-            response = requests.get(f"https://www.strava.com/api/v3/segments/{segment_id}", 
-                                  headers=headers, timeout=10)
-            time.sleep(0.1)  # Rate limiting
-            
-            if response.status_code == 200:
-                segment_cache[segment_id] = response.json()
-                logger.debug(f"Cached segment {segment_id}")
-            else:
-                logger.warning(f"Failed to fetch segment {segment_id}: {response.status_code}")
-                segment_cache[segment_id] = None
-                
-        except requests.RequestException as e:
-            logger.error(f"Error fetching segment {segment_id}: {e}")
-            segment_cache[segment_id] = None
-            
-    return segment_cache[segment_id]
+    fresh = load_segment_metadata(cur, segment_ids)
+    stale = [segment_id for segment_id in dict.fromkeys(segment_ids) if segment_id not in fresh]
+    if not stale:
+        return 0
+    
+    cur.execute("SELECT segment_id, segment_name FROM segment_metadata WHERE segment_id = ANY(%s)", (stale,))
+    names = {row["segment_id"]: row["segment_name"] for row in cur.fetchall()}
+    
+    failed = renamed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        lookups = executor.map(lambda segment_id: fetch_segment_metadata(client, token, segment_id), stale)
+        for segment_id, (metadata, error) in zip(stale, lookups):
+            save_segment_metadata(cur, segment_id, metadata, error)
+            failed += error is not None
+            renamed += bool(metadata and metadata.get("name") and metadata["name"] != names.get(segment_id))
+    
+    logger.info(f"Segment metadata: {len(fresh)} cached, {len(stale) - failed} fetched, {failed} failed, "
+                f"{renamed} renamed")
+    return renamed
+
+def activity_start_timestamp(activity):
+    """
+    Returns an activity's Unix start time, as Strava's after/before filters see it.
+    
+    Args:
+        activity (dict): Activity summary from the Strava API
+        
+    Returns:
+        int: Unix timestamp
+    """
+    start = activity.get("start_date") or activity["start_date_local"]
+    return int(datetime.fromisoformat(start.replace('Z', '+00:00')).timestamp())
 
-def fetch_and_store_efforts(token, athlete_id, athlete_name, cur, segment_ids):
+def get_sync_state(cur, athlete_id):
     """
-    Fetch segment efforts for a user and store in database.
+    Returns the newest activity already ingested for an athlete.
     
     Args:
+        cur: Database cursor (RealDictCursor)
+        athlete_id (int): Strava athlete ID
+        
+    Returns:
+        dict: last_activity_start and last_activity_id, or None before the first sync
+    """
+    cur.execute("""
+        SELECT last_activity_start, last_activity_id
+        FROM athlete_sync_state
+        WHERE athlete_id = %s
+    """, (athlete_id,))
+    return cur.fetchone()
+
+def save_sync_state(cur, athlete_id, last_activity_start, last_activity_id):
+    """
+    Records an athlete's ingestion high-water mark. Never moves it backwards.
+    
+    Args:
+        cur: Database cursor
+        athlete_id (int): Strava athlete ID
+        last_activity_start (int): Unix start time of the newest ingested activity
+        last_activity_id (int): Strava ID of that activity
+    """
+    cur.execute("""
+        INSERT INTO athlete_sync_state (athlete_id, last_activity_start, last_activity_id, updated_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (athlete_id) DO UPDATE SET
+            last_activity_start = EXCLUDED.last_activity_start,
+            last_activity_id = EXCLUDED.last_activity_id,
+            updated_at = EXCLUDED.updated_at
+        WHERE athlete_sync_state.last_activity_start <= EXCLUDED.last_activity_start
+    """, (athlete_id, last_activity_start, last_activity_id))
+
+def fetch_window_start(last_activity_start):
+    """
+    Returns the `after` timestamp for an athlete's next fetch.
+    
+    Args:
+        last_activity_start (int): Athlete's high-water mark, or None to fetch the whole tracking period
+        
+    Returns:
+        int: Unix timestamp to pass as Strava's after= filter
+    """
+    if last_activity_start is None:
+        return TRACKING_START
+    return max(TRACKING_START, last_activity_start - SYNC_OVERLAP_SECONDS)
+
+def recheck_window_start(last_activity_start):
+    """
+    Returns the start of an athlete's sync overlap, where activities processed
+    by an earlier run are read again in case they were edited since.
+
+    Args:
+        last_activity_start (int): Athlete's high-water mark, or None
+
+    Returns:
+        int: Unix timestamp, or None when there is no overlap yet
+    """
+    if last_activity_start is None:
+        return None
+    return fetch_window_start(last_activity_start)
+
+def load_sync_states(cur):
+    """
+    Loads every athlete's high-water mark in one query.
+    
+    Returns:
+        dict: athlete_id -> last_activity_start
+    """
+    cur.execute("SELECT athlete_id, last_activity_start FROM athlete_sync_state")
+    return {row["athlete_id"]: row["last_activity_start"] for row in cur.fetchall()}
+
+def load_known_activities(cur):
+    """
+    Loads every activity already processed, per athlete, in one query.
+    
+    Returns:
+        dict: athlete_id -> set of activity IDs
+    """
+    cur.execute("SELECT athlete_id, activity_id FROM processed_activities")
+    known = {}
+    for row in cur.fetchall():
+        known.setdefault(row["athlete_id"], set()).add(row["activity_id"])
+    return known
+
+def fetch_efforts(client, token, athlete_id, athlete_name, segment_ids, after, known_activities=frozenset(),
+                  challenges=None, recheck_after=None):
+    """
+    Fetch segment efforts for a user from Strava. Makes no database calls, so it
+    is safe to run from worker threads.
+    
+    Args:
+        client (StravaClient): Shared Strava API client
         token (str): Strava access token
         athlete_id (int): Strava athlete ID
         athlete_name (str): Athlete display name
-        cur: Database cursor
         segment_ids (list): List of segment IDs to track
+        after (int): Only activities starting after this Unix timestamp are requested
+        known_activities (set): Activity IDs processed by an earlier run; their
+            details are not fetched again
+        challenges (ChallengeIndex): Challenge windows; without one only segment_ids are tracked
+        recheck_after (int): Known activities starting at or after this Unix timestamp
+            are fetched again to pick up edits; None skips every known activity
+        
+    Returns:
+        tuple: (batch_data, high_water, activities) where batch_data holds segment_efforts
+        rows, high_water is the (start timestamp, activity id) the sync state may advance to
+        and activities lists (activity id, start timestamp, tracked efforts) for every
+        newly processed activity. None if the activity list could not be fetched.
     """
-    headers = {'Authorization': f'Bearer {token}'}
-    after = 1751864400  # Start of tracking period
-    after = 1751418832 # Use this for testing 
-    before = 1752454800  # End of tracking period
-    
-    params = {
-        "before": before,
-        "after": after,
-        "per_page": 50,
-        "page": 1,
-        "include_all_efforts": True
-    }
-    
     batch_data = []
+    processed = []  # (start timestamp, activity id) of every fully processed activity
+    activities_done = []  # (activity id, start timestamp, tracked efforts) of newly processed ones
+    first_failure = None  # start timestamp of the earliest activity that could not be processed
+    already_known = 0
+    if challenges is None:
+        challenges = ChallengeIndex(segment_ids)
     
     try:
         # Get activities with pagination support
         page = 1
         while True:
-            params["page"] = page
-            
-            response = requests.get("https://www.strava.com/api/v3/athlete/activities", 
-                                  headers=headers, params=params, timeout=10)
-            time.sleep(0.1)  # Rate limiting
-            
-            if response.status_code == 429:
-                logger.warning("Rate limit hit, waiting 60 seconds...")
-                time.sleep(60)
-                continue
-                
-            response.raise_for_status()
-            activities = response.json()
+            # The client waits out exhausted rate limit windows (and retries 429s) as needed
+            activities = client.get_athlete_activities(token, after, TRACKING_END, page=page, per_page=50)
             
             if not activities:
                 break
@@ -152,11 +332,18 @@ def fetch_and_store_efforts(token, athlete_id, athlete_name, cur, segment_ids):
             logger.info(f"Processing page {page} ({len(activities)} activities) for {athlete_name}")
             
             for activity in activities:
+                started_at = activity_start_timestamp(activity)
+                
+                # Stored (or found to have no tracked efforts) by an earlier run, before the overlap
+                if activity["id"] in known_activities and (recheck_after is None or started_at < recheck_after):
+                    processed.append((started_at, activity["id"]))
+                    already_known += 1
+                    continue
+                
                 activity_timestamp = int(datetime.fromisoformat(activity["start_date_local"].replace('Z', '+00:00')).timestamp())
                 
-                # Get valid challenge segments for this activity's timestamp
-                valid_challenge_segments = get_valid_challenge_segments(activity_timestamp)
-                valid_segments = set(segment_ids + valid_challenge_segments)
+                # Base segments plus any challenge open at this activity's start
+                valid_segments = challenges.segments_at(activity_timestamp)
                 
                 # Process segment efforts
                 efforts = []
@@ -165,14 +352,15 @@ def fetch_and_store_efforts(token, athlete_id, athlete_name, cur, segment_ids):
                 else:
                     # Fallback to detailed fetch
                     try:
-                        details = requests.get(f"https://www.strava.com/api/v3/activities/{activity['id']}", 
-                                             headers=headers, timeout=10).json()
-                        time.sleep(0.1)
+                        details = client.get_activity(token, activity["id"])
                         efforts = details.get("segment_efforts", [])
                     except requests.RequestException as e:
                         logger.error(f"Failed to fetch activity {activity['id']}: {e}")
+                        if first_failure is None or started_at < first_failure:
+                            first_failure = started_at
                         continue
                 
+                tracked = 0
                 for effort in efforts:
                     sid = effort["segment"]["id"]
                     if sid in valid_segments:
@@ -180,28 +368,310 @@ def fetch_and_store_efforts(token, athlete_id, athlete_name, cur, segment_ids):
                             athlete_name, athlete_id, sid, effort["segment"]["name"], 
                             activity["id"], effort["elapsed_time"], effort["start_date_local"]
                         ))
+                        tracked += 1
+                
+                processed.append((started_at, activity["id"]))
+                activities_done.append((activity["id"], started_at, tracked))
             
             page += 1
             
     except requests.RequestException as e:
         logger.error(f"Error fetching activities for {athlete_name}: {e}")
+        return None
+    
+    if already_known:
+        logger.info(f"Skipped {already_known} already processed activities for {athlete_name}")
+    
+    # Advance the high-water mark, but never past an activity that still needs a retry
+    completed = [p for p in processed if first_failure is None or p[0] < first_failure]
+    return batch_data, (max(completed) if completed else None), activities_done
+
+def update_segment_bests(cur, athlete_id, athlete_name, new_rows):
+    """
+    Folds newly inserted efforts into athlete_segment_best, the per-athlete
+    summary the leaderboards and scoring read.
+
+    Args:
+        cur: Database cursor
+        athlete_id (int): Strava athlete ID
+        athlete_name (str): Athlete display name
+        new_rows (list): Rows returned by the effort insert (id, segment_id,
+            segment_name, activity_id, elapsed_time); rows already stored are not included
+    """
+    bests = {}
+    for row in new_rows:
+        effort_id, segment_id, segment_name, activity_id, elapsed_time = (
+            row["id"], row["segment_id"], row["segment_name"], row["activity_id"], row["elapsed_time"])
+        best = bests.get(segment_id)
+        if best is None:
+            bests[segment_id] = [segment_name, elapsed_time, activity_id, effort_id, 1]
+            continue
+        best[4] += 1
+        if (elapsed_time, effort_id) < (best[1], best[3]):
+            best[1:4] = [elapsed_time, activity_id, effort_id]
+    if not bests:
         return
+
+    # Ties on time keep the earlier-stored effort, matching ORDER BY elapsed_time, id
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO athlete_segment_best AS b
+            (athlete_id, segment_id, athlete_name, segment_name,
+             best_time, best_activity_id, best_effort_id, effort_count)
+        VALUES %s
+        ON CONFLICT (athlete_id, segment_id) DO UPDATE SET
+            athlete_name = EXCLUDED.athlete_name,
+            segment_name = EXCLUDED.segment_name,
+            best_time = CASE WHEN (EXCLUDED.best_time, EXCLUDED.best_effort_id) < (b.best_time, b.best_effort_id)
+                             THEN EXCLUDED.best_time ELSE b.best_time END,
+            best_activity_id = CASE WHEN (EXCLUDED.best_time, EXCLUDED.best_effort_id) < (b.best_time, b.best_effort_id)
+                                    THEN EXCLUDED.best_activity_id ELSE b.best_activity_id END,
+            best_effort_id = CASE WHEN (EXCLUDED.best_time, EXCLUDED.best_effort_id) < (b.best_time, b.best_effort_id)
+                                  THEN EXCLUDED.best_effort_id ELSE b.best_effort_id END,
+            effort_count = b.effort_count + EXCLUDED.effort_count,
+            updated_at = CURRENT_TIMESTAMP
+    """, [
+        (athlete_id, segment_id, athlete_name, segment_name, best_time, activity_id, effort_id, count)
+        for segment_id, (segment_name, best_time, activity_id, effort_id, count) in bests.items()
+    ], page_size=INSERT_PAGE_SIZE)
+
+def register_segments(cur, new_rows):
+    """
+    Makes sure every segment with efforts has a segment_metadata row, named
+    from the effort, so the app lists it before its metadata is fetched.
+    The row starts out expired, so the next warm-up fetches the full metadata.
+    An existing row keeps its name; one without a name takes the effort's.
+    """
+    names = {row["segment_id"]: row["segment_name"] for row in new_rows}
+    if names:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO segment_metadata (segment_id, segment_name, expires_at)
+            VALUES %s
+            ON CONFLICT (segment_id) DO UPDATE SET
+                segment_name = COALESCE(segment_metadata.segment_name, EXCLUDED.segment_name)
+        """, list(names.items()), template="(%s, %s, CURRENT_TIMESTAMP)")
+
+def store_efforts(cur, athlete_id, athlete_name, batch_data, high_water, activities=()):
+    """
+    Store fetched segment efforts, record the processed activities and advance
+    the athlete's high-water mark.
     
-    # Batch insert collected data
+    Args:
+        cur: Database cursor
+        athlete_id (int): Strava athlete ID
+        athlete_name (str): Athlete display name
+        batch_data (list): segment_efforts rows from fetch_efforts
+        high_water (tuple): (start timestamp, activity id) or None
+        activities (list): (activity id, start timestamp, tracked efforts) from fetch_efforts
+        
+    Returns:
+        tuple: (inserted, skipped) effort counts; skipped rows were already stored
+    """
+    inserted = 0
+    
+    # Bulk insert collected data, INSERT_PAGE_SIZE rows per statement
     if batch_data:
         try:
-            cur.executemany("""
+            new_rows = psycopg2.extras.execute_values(cur, """
                 INSERT INTO segment_efforts
                 (athlete_name, athlete_id, segment_id, segment_name, activity_id, elapsed_time, start_date_local)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                VALUES %s
                 ON CONFLICT (athlete_id, segment_id, activity_id) DO NOTHING
-            """, batch_data)
-            logger.info(f"Inserted {len(batch_data)} efforts for {athlete_name}")
+                RETURNING id, segment_id, segment_name, activity_id, elapsed_time
+            """, batch_data, page_size=INSERT_PAGE_SIZE, fetch=True)
+            inserted = len(new_rows)
+            update_segment_bests(cur, athlete_id, athlete_name, new_rows)
+            register_segments(cur, new_rows)
+            logger.info(f"Inserted {inserted} efforts for {athlete_name} "
+                        f"({len(batch_data) - inserted} already stored)")
         except psycopg2.Error as e:
             logger.error(f"Database error inserting efforts: {e}")
             raise
+    
+    # Activities without tracked efforts are recorded too, so they are never fetched again
+    if activities:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO processed_activities (athlete_id, activity_id, start_ts, tracked_efforts)
+            VALUES %s
+            ON CONFLICT (athlete_id, activity_id) DO UPDATE SET
+                start_ts = EXCLUDED.start_ts,
+                tracked_efforts = EXCLUDED.tracked_efforts,
+                processed_at = CURRENT_TIMESTAMP
+        """, [(athlete_id, *activity) for activity in activities], page_size=INSERT_PAGE_SIZE)
+    
+    if high_water:
+        save_sync_state(cur, athlete_id, *high_water)
+    
+    return inserted, len(batch_data) - inserted
+
+def refresh_expiring_tokens(cur, client, users, horizon=TOKEN_REFRESH_HORIZON, workers=1):
+    """
+    Token maintenance stage: refreshes every token expiring within `horizon`
+    seconds, concurrently (the shared rate limiter bounds the calls), and writes
+    them back with one UPDATE.
+    
+    Args:
+        cur: Database cursor; only this thread writes
+        client (StravaClient): Strava API client holding the app credentials
+        users (list): Rows from the credentials table
+        horizon (int): Seconds of remaining validity below which a token is refreshed
+        workers (int): Concurrent refresh calls
+        
+    Returns:
+        list: The users with their current tokens; rows whose refresh failed are
+        returned unchanged
+    """
+    cutoff = int(time.time()) + horizon
+    due = [user for user in users if user["expires_at"] <= cutoff]
+    if not due:
+        return users
+    
+    def refresh(user):
+        try:
+            return client.refresh_token(user["refresh_token"]), None
+        except Exception as e:
+            return None, e
+    
+    refreshed = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for user, (tokens, error) in zip(due, executor.map(refresh, due)):
+            if error is not None:
+                logger.error(f"Failed to refresh token for {user['athlete_name']}: {error}")
+                continue
+            refreshed[user["athlete_id"]] = tokens
+    
+    if refreshed:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE credentials AS c
+            SET access_token = v.access_token, refresh_token = v.refresh_token, expires_at = v.expires_at
+            FROM (VALUES %s) AS v (athlete_id, access_token, refresh_token, expires_at)
+            WHERE c.athlete_id = v.athlete_id
+        """, [(athlete_id, tokens["access_token"], tokens["refresh_token"], tokens["expires_at"])
+              for athlete_id, tokens in refreshed.items()])
+    logger.info(f"Refreshed {len(refreshed)} of {len(due)} tokens expiring within {horizon}s")
+    
+    return [
+        {**user, **{key: refreshed[user["athlete_id"]][key]
+                    for key in ("access_token", "refresh_token", "expires_at")}}
+        if user["athlete_id"] in refreshed else user
+        for user in users
+    ]
 
-def update_tokens_and_fetch_activities():
+def process_athlete(client, user, segment_ids, after, known_activities=frozenset(), challenges=None,
+                    recheck_after=None):
+    """
+    Worker task: fetches the athlete's efforts. Tokens were refreshed beforehand by
+    refresh_expiring_tokens, so this never waits on OAuth. Never touches the
+    database; the results are written by apply_athlete_result.
+    
+    Args:
+        client (StravaClient): Shared Strava API client holding the app credentials
+        user (dict): Row from the credentials table, with refreshed tokens
+        segment_ids (list): List of segment IDs to track
+        after (int): Unix timestamp to fetch activities after
+        known_activities (set): Activity IDs already processed for this athlete
+        challenges (ChallengeIndex): Challenge windows shared by all workers
+        recheck_after (int): Start of the sync overlap, where known activities are read again
+        
+    Returns:
+        dict: user, fetch_efforts result (or None) and error (or None); a spent
+        Strava budget is an error, and the athlete is fetched again next run
+    """
+    result = {"user": user, "efforts": None, "error": None}
+    logger.info(f"Processing user: {user['athlete_name']}")
+    
+    # Only left expired when the refresh stage failed for this athlete
+    if int(time.time()) >= user["expires_at"]:
+        result["error"] = "access token expired and could not be refreshed"
+        return result
+    
+    try:
+        result["efforts"] = fetch_efforts(client, user["access_token"], user["athlete_id"], user["athlete_name"], 
+                                          segment_ids, after, known_activities, challenges, recheck_after)
+    except RateLimitExceeded as e:
+        # Nothing is stored and the high-water mark stays put, so no activity is lost
+        result["error"] = str(e)
+    return result
+
+def apply_athlete_result(cur, result):
+    """
+    Writes one athlete's efforts. Only the thread that owns
+    the cursor calls this, so the cursor is never shared between workers.
+    
+    Args:
+        cur: Database cursor
+        result (dict): Return value of process_athlete
+        
+    Returns:
+        tuple: (inserted, skipped) effort counts
+    """
+    user = result["user"]
+    if result["error"] is not None:
+        logger.error(f"Skipping {user['athlete_name']}: {result['error']}")
+        return 0, 0
+    
+    if result["efforts"] is None:
+        return 0, 0
+    return store_efforts(cur, user["athlete_id"], user["athlete_name"], *result["efforts"])
+
+def start_or_resume_run(cur, full_backfill, resume_window=PIPELINE_RESUME_WINDOW):
+    """
+    Picks up the latest unfinished run of the same kind if it started within
+    resume_window seconds (e.g. a timed-out or crashed invocation), otherwise
+    starts a new one.
+    
+    Args:
+        cur: Database cursor (RealDictCursor)
+        full_backfill (bool): Kind of run; backfills only resume backfills
+        resume_window (int): Maximum age in seconds of a run that may be resumed
+        
+    Returns:
+        tuple: (run_id, done) where done is the set of athlete IDs already finished in that run
+    """
+    if resume_window > 0:
+        cur.execute("""
+            SELECT run_id FROM pipeline_runs
+            WHERE status <> 'completed' AND full_backfill = %s
+              AND started_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+            ORDER BY run_id DESC
+            LIMIT 1
+        """, (full_backfill, resume_window))
+        row = cur.fetchone()
+        if row:
+            cur.execute("UPDATE pipeline_runs SET status = 'running', resumes = resumes + 1 WHERE run_id = %s",
+                        (row["run_id"],))
+            cur.execute("SELECT athlete_id FROM pipeline_run_athletes WHERE run_id = %s AND status = 'done'",
+                        (row["run_id"],))
+            return row["run_id"], {r["athlete_id"] for r in cur.fetchall()}
+    
+    cur.execute("INSERT INTO pipeline_runs (full_backfill) VALUES (%s) RETURNING run_id", (full_backfill,))
+    return cur.fetchone()["run_id"], set()
+
+def record_athlete_checkpoint(cur, run_id, athlete_id, status, inserted=0, skipped=0):
+    """Records that an athlete finished ('done') or failed ('failed') in a run."""
+    cur.execute("""
+        INSERT INTO pipeline_run_athletes (run_id, athlete_id, status, inserted, skipped)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (run_id, athlete_id) DO UPDATE SET
+            status = EXCLUDED.status,
+            inserted = EXCLUDED.inserted,
+            skipped = EXCLUDED.skipped,
+            finished_at = CURRENT_TIMESTAMP
+    """, (run_id, athlete_id, status, inserted, skipped))
+
+def finish_run(cur, run_id, status):
+    """Marks a run 'completed' (never resumed) or 'failed' (resumable) and totals its athletes' counts."""
+    cur.execute("""
+        UPDATE pipeline_runs AS r
+        SET status = %s, finished_at = CURRENT_TIMESTAMP,
+            efforts_inserted = COALESCE(totals.inserted, 0), efforts_skipped = COALESCE(totals.skipped, 0)
+        FROM (
+            SELECT SUM(inserted) AS inserted, SUM(skipped) AS skipped
+            FROM pipeline_run_athletes WHERE run_id = %s
+        ) AS totals
+        WHERE r.run_id = %s
+    """, (status, run_id, run_id))
+
+def update_tokens_and_fetch_activities(full_backfill=None):
     """
     Main function to update tokens and fetch segment efforts for all users.
     """
@@ -209,63 +679,127 @@ def update_tokens_and_fetch_activities():
     client_id = os.getenv("CLIENT_ID")
     client_secret = os.getenv("CLIENT_SECRET")
     
+    # Incremental by default; a full backfill re-reads the whole tracking period
+    if full_backfill is None:
+        full_backfill = os.getenv("PIPELINE_FULL_BACKFILL", "0") == "1"
+    
+    # Athletes fetched concurrently; 1 processes them one after another
+    workers = max(1, int(os.getenv("PIPELINE_WORKERS", 1)))
+    
     if not client_id or not client_secret:
         logger.error("Missing CLIENT_ID or CLIENT_SECRET in environment")
         return
     
+    # One pooled keep-alive session shared by all workers
+    client = get_strava_client(client_id, client_secret)
+    
     # Use TEST_SEGMENT for testing, ALL_SEGMENT_IDS for production
     SEGMENT_IDS = ALL_SEGMENT_IDS
     
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    with get_db_connection() as conn:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        run_id = None
     
-    try:
-        cur.execute("SELECT * FROM credentials")
-        users = cur.fetchall()
+        try:
+            cur.execute("SELECT * FROM credentials")
+            users = cur.fetchall()
         
-        if not users:
-            logger.warning("No users found in credentials table")
-            return
+            if not users:
+                logger.warning("No users found in credentials table")
+                return
             
-        logger.info(f"Processing {len(users)} users")
-        
-        for user in users:
-            logger.info(f"Processing user: {user['athlete_name']}")
+            # Refresh everything close to expiry up front and commit right away:
+            # Strava may rotate refresh tokens, so they must not be lost to a later rollback
+            users = refresh_expiring_tokens(cur, client, users, TOKEN_REFRESH_HORIZON, workers)
+            conn.commit()
             
-            # Check if token needs refresh
-            if int(time.time()) >= user["expires_at"]:
-                logger.info(f"Refreshing token for {user['athlete_name']}")
-                try:
-                    tokens = refresh_access_token(client_id, client_secret, user["refresh_token"])
-                    cur.execute("""
-                        UPDATE credentials SET access_token=%s, refresh_token=%s, expires_at=%s
-                        WHERE athlete_id=%s
-                    """, (tokens['access_token'], tokens['refresh_token'], 
-                         tokens['expires_at'], user["athlete_id"]))
-                    access_token = tokens["access_token"]
-                    logger.info(f"Token refreshed for {user['athlete_name']}")
-                except Exception as e:
-                    logger.error(f"Failed to refresh token for {user['athlete_name']}: {e}")
-                    continue
-            else:
-                access_token = user["access_token"]
+            sync_states = {} if full_backfill else load_sync_states(cur)
+            # A full backfill re-reads every activity; otherwise processed ones are skipped
+            known_activities = {} if full_backfill else load_known_activities(cur)
+            challenges = load_challenge_index(cur, SEGMENT_IDS)
+            
+            # Athletes finished by an interrupted run are not fetched again
+            run_id, done = start_or_resume_run(cur, full_backfill)
+            conn.commit()
+            pending = [user for user in users if user["athlete_id"] not in done]
+            if done:
+                logger.info(f"Resuming run {run_id}: {len(done)} of {len(users)} athletes already done")
+            logger.info(f"Processing {len(pending)} users with {workers} worker(s)")
             
-            # Fetch and store efforts
-            fetch_and_store_efforts(access_token, user["athlete_id"], 
-                                  user["athlete_name"], cur, SEGMENT_IDS)
+            # Workers only talk to Strava; this thread is the single database writer.
+            # Each athlete is committed on its own, so a failure only loses that athlete,
+            # and the web app sees each athlete's efforts as soon as they are committed.
+            executor = ThreadPoolExecutor(max_workers=workers)
+            inserted = skipped = failed = 0
+            try:
+                futures = {
+                    executor.submit(process_athlete, client, user, SEGMENT_IDS,
+                                    fetch_window_start(sync_states.get(user["athlete_id"])),
+                                    known_activities.get(user["athlete_id"], frozenset()), challenges,
+                                    recheck_window_start(sync_states.get(user["athlete_id"]))): user
+                    for user in pending
+                }
+                for future in as_completed(futures):
+                    user = futures[future]
+                    try:
+                        result = future.result()
+                        athlete_inserted, athlete_skipped = apply_athlete_result(cur, result)
+                        status = "done" if result["error"] is None and result["efforts"] is not None else "failed"
+                        record_athlete_checkpoint(cur, run_id, user["athlete_id"], status,
+                                                  athlete_inserted, athlete_skipped)
+                        # Committed efforts are live: let the app drop its cached standings now
+                        if athlete_inserted:
+                            bump_data_version(cur)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error(f"Failed to process {user['athlete_name']}: {e}")
+                        record_athlete_checkpoint(cur, run_id, user["athlete_id"], "failed")
+                        conn.commit()
+                        failed += 1
+                        continue
+                    failed += status == "failed"
+                    inserted += athlete_inserted
+                    skipped += athlete_skipped
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
             
-            # Rate limiting between users
-            time.sleep(0.2)
+            # Segment names for the app; only missing or expired entries cost an API call
+            metadata_token = next((user["access_token"] for user in users
+                                   if user["expires_at"] > int(time.time())), None)
+            renamed = 0
+            if metadata_token:
+                renamed = warm_segment_metadata(cur, client, metadata_token,
+                                                SEGMENT_IDS + challenges.challenge_segment_ids, workers)
+            else:
+                logger.warning("No valid access token; skipping segment metadata warm-up")
         
-        conn.commit()
-        logger.info("All users processed successfully")
+            finish_run(cur, run_id, "completed")
+            # New efforts were announced with each athlete's commit; only new names are left
+            if renamed:
+                bump_data_version(cur)
+            conn.commit()
+            logger.info(f"Run {run_id} finished: {inserted} efforts inserted, "
+                        f"{skipped} skipped as already stored, {failed} athletes failed")
         
-    except Exception as e:
-        conn.rollback()
-        logger.error(f"Error during update: {e}")
-        raise
-    finally:
-        conn.close()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error during update: {e}")
+            # Efforts committed so far stay (already announced); leave the run resumable
+            if run_id is not None:
+                try:
+                    finish_run(cur, run_id, "failed")
+                    conn.commit()
+                except psycopg2.Error:
+                    conn.rollback()
+            raise
 
 if __name__ == "__main__":
-    update_tokens_and_fetch_activities()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fetch Strava segment efforts for all authorized athletes")
+    parser.add_argument("--backfill", action="store_true",
+                        help="ignore per-athlete high-water marks and re-fetch the whole tracking period")
+    args = parser.parse_args()
+    try:
+        update_tokens_and_fetch_activities(full_backfill=args.backfill or None)
+    finally:
+        close_pool()
\ No newline at end of file
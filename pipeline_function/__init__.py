@@ -1,11 +1,17 @@
 import logging
 import azure.functions as func
 from .pipeline_logic import update_tokens_and_fetch_activities
+from database import get_db_connection
+# Copied into the package by the deploy workflow
+from migrate import apply_migrations
 
 def main(mytimer: func.TimerRequest) -> None:
     logging.info('Python timer trigger function is starting the Strava pipeline.')
     
     try:
+        # The pipeline needs the current schema; already-applied migrations are skipped
+        with get_db_connection() as conn:
+            apply_migrations(conn)
         update_tokens_and_fetch_activities()
         logging.info('Strava data pipeline completed successfully.')
     except Exception as e:
@@ -1,16 +1,251 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from dotenv import load_dotenv
 
-def get_db_connection():
-    """Gets a PostgreSQL database connection."""
-    load_dotenv() # Looks for .env file in the root
-    return psycopg2.connect(
+load_dotenv() # Looks for .env file in the root
+
+# Pool sizing and connection lifetime, tunable per deployment
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))                # connections opened when the pool is first used
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 5))                # connections open at once, idle or in use
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))     # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))     # seconds before a connection is replaced
+DB_POOL_PING_AFTER = int(os.getenv("DB_POOL_PING_AFTER", 30))  # idle seconds before a health check
+
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_idle = []       # connections ready for reuse, most recently returned last
+_conn_meta = {}  # id(conn) -> {"created": ts, "last_used": ts}, for every open pooled connection
+_orphaned = []   # a parent process's connections, kept alive in a forked child (see _reset_after_fork)
+_connection_factory = None  # psycopg2 connection class, e.g. metrics.TimedConnection
+
+
+def _connect_kwargs():
+    kwargs = dict(
         host=os.getenv("DB_HOST"),
         database=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
         port=os.getenv("DB_PORT", 5432),
-        sslmode='require'
-    )
\ No newline at end of file
+        sslmode=os.getenv("DB_SSLMODE", "require")
+    )
+    if _connection_factory is not None:
+        kwargs["connection_factory"] = _connection_factory
+    return kwargs
+
+
+def set_connection_factory(factory):
+    """
+    Sets the psycopg2 connection class for connections opened from now on,
+    e.g. one whose cursors time their queries. Idle pooled connections opened
+    earlier keep their class until they are replaced, so call it before the
+    first get_db_connection() for every connection to use it.
+    """
+    global _connection_factory
+    _connection_factory = factory
+
+
+def _detach(conn):
+    """
+    Points an inherited connection's socket at /dev/null, so that freeing the
+    connection object later cannot send anything down the parent's socket.
+    """
+    try:
+        fd = conn.fileno()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        try:
+            os.dup2(devnull, fd)
+        finally:
+            os.close(devnull)
+    except (OSError, psycopg2.Error):
+        pass
+
+
+def _reset_after_fork():
+    """
+    Forgets the parent's pool in a freshly forked worker (e.g. gunicorn pre-fork).
+
+    The inherited sockets belong to the parent. Freeing the connection objects
+    would run PQfinish and send a Terminate message down the shared socket,
+    ending the parent's sessions. So each socket is first swapped for /dev/null
+    and the objects are kept referenced in _orphaned, never used or freed.
+    """
+    global _pool_pid, _pool_lock, _pool_slots, _idle
+    for conn in _idle:
+        _detach(conn)
+    _orphaned.extend(_idle)
+    _idle = []
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+    _conn_meta.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _connect():
+    conn = psycopg2.connect(**_connect_kwargs())
+    now = time.monotonic()
+    _conn_meta[id(conn)] = {"created": now, "last_used": now}
+    return conn
+
+
+def _discard(conn):
+    """Closes a pooled connection and forgets it, so a recycled id() starts fresh."""
+    _conn_meta.pop(id(conn), None)
+    try:
+        conn.close()
+    except psycopg2.Error:
+        pass
+
+
+def _ensure_pool():
+    """Opens DB_POOL_MIN connections the first time this process uses the pool."""
+    global _pool_pid
+    if _pool_pid == os.getpid():
+        return
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            while len(_idle) < min(DB_POOL_MIN, DB_POOL_MAX):
+                _idle.append(_connect())
+            _pool_pid = os.getpid()
+
+
+def _checkout():
+    """
+    Takes a healthy idle connection, recycling stale or broken ones, or opens
+    a new one when none is idle. The caller holds a slot, so at most
+    DB_POOL_MAX connections are ever open.
+    """
+    while True:
+        with _pool_lock:
+            conn = _idle.pop() if _idle else None
+        if conn is None:
+            return _connect()
+
+        now = time.monotonic()
+        meta = _conn_meta.setdefault(id(conn), {"created": now, "last_used": now})
+        if conn.closed or now - meta["created"] > DB_POOL_RECYCLE:
+            _discard(conn)
+            continue
+
+        if now - meta["last_used"] > DB_POOL_PING_AFTER:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                _discard(conn)
+                continue
+
+        return conn
+
+
+def _checkin(conn, broken):
+    """Returns a connection to the idle list in a clean state."""
+    if not broken and not conn.closed:
+        try:
+            # Never hand the next borrower an open transaction
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            broken = True
+
+    if broken or conn.closed:
+        _discard(conn)
+        return
+    _conn_meta.setdefault(id(conn), {"created": time.monotonic()})["last_used"] = time.monotonic()
+    with _pool_lock:
+        if len(_idle) < DB_POOL_MAX:
+            _idle.append(conn)
+            return
+    _discard(conn)
+
+
+@contextmanager
+def get_db_connection():
+    """
+    Borrows a PostgreSQL connection from the process-wide pool.
+
+    Usage:
+        with get_db_connection() as conn:
+            ...
+            conn.commit()
+
+    Work that is not committed when the block exits is rolled back. Up to
+    DB_POOL_MAX connections are kept open and reused.
+
+    Raises:
+        psycopg2.pool.PoolError: If all DB_POOL_MAX connections stay in use
+            for DB_POOL_TIMEOUT seconds
+    """
+    _ensure_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise psycopg2.pool.PoolError(
+            f"No database connection became free within {DB_POOL_TIMEOUT:g}s (DB_POOL_MAX={DB_POOL_MAX})")
+    conn = None
+    broken = False
+    try:
+        conn = _checkout()
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        if conn is not None:
+            _checkin(conn, broken)
+        slots.release()
+
+
+def open_connection():
+    """
+    Opens a dedicated connection outside the pool, for long-lived sessions such
+    as a LISTEN that would otherwise hold a pool slot forever. The caller closes it.
+    """
+    return psycopg2.connect(**_connect_kwargs())
+
+
+def close_pool():
+    """Closes every idle pooled connection, e.g. at the end of a pipeline run."""
+    global _pool_pid
+    with _pool_lock:
+        idle = list(_idle)
+        _idle.clear()
+        _pool_pid = None
+    for conn in idle:
+        _discard(conn)
+
+
+# NOTIFY channel announcing a new data_version; the payload is the version
+DATA_VERSION_CHANNEL = "data_version"
+
+
+def bump_data_version(cur):
+    """
+    Marks segment data as changed so the web app's cached standings are refreshed.
+
+    Runs inside the caller's transaction; the new version becomes visible on commit,
+    and only then is it announced to listeners on DATA_VERSION_CHANNEL.
+    """
+    cur.execute("""
+        INSERT INTO data_version (id, version, updated_at)
+        VALUES (1, 1, CURRENT_TIMESTAMP)
+        ON CONFLICT (id) DO UPDATE SET
+            version = data_version.version + 1,
+            updated_at = EXCLUDED.updated_at
+        RETURNING version
+    """)
+    version = cur.fetchone()
+    version = version["version"] if isinstance(version, dict) else version[0]
+    cur.execute("SELECT pg_notify(%s, %s)", (DATA_VERSION_CHANNEL, str(version)))
@@ -0,0 +1,148 @@
+# strava_client.py
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.rate_limiter import strava_limiter
+
+STRAVA_API_BASE = "https://www.strava.com/api/v3"
+STRAVA_OAUTH_BASE = "https://www.strava.com/oauth"
+
+
+class StravaClient:
+    """
+    Strava API client that owns one pooled, keep-alive requests.Session.
+
+    Every call goes through the shared rate limiter (which handles 429s).
+    Connection errors and 5xx answers to GETs are retried with backoff by the
+    session's adapter. HTTP errors are raised as requests.HTTPError, so callers
+    keep catching requests.RequestException as before.
+
+    Args:
+        client_id (str): Strava API client ID, needed for the token endpoints
+        client_secret (str): Strava API client secret
+        limiter (RateLimiter): Budget shared with every other Strava caller
+        timeout (float): Seconds per request
+        pool_size (int): Keep-alive connections kept per host
+        retries (int): Retries for connection errors and 5xx responses
+    """
+
+    def __init__(self, client_id=None, client_secret=None, limiter=strava_limiter,
+                 api_base=STRAVA_API_BASE, oauth_base=STRAVA_OAUTH_BASE,
+                 timeout=10, pool_size=10, retries=3):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.limiter = limiter
+        self.api_base = api_base.rstrip("/")
+        self.oauth_base = oauth_base.rstrip("/")
+        self.timeout = timeout
+
+        retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get(self, path, token, params=None):
+        response = self.limiter.call(self.session.get, f"{self.api_base}{path}",
+                                     headers={'Authorization': f'Bearer {token}'},
+                                     params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _token_request(self, data):
+        response = self.limiter.call(self.session.post, f"{self.oauth_base}/token", data={
+            'client_id': self.client_id,
+            'client_secret': self.client_secret,
+            **data
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_athlete_activities(self, token, after, before, page=1, per_page=50):
+        """
+        Lists one page of the athlete's activities.
+
+        Args:
+            token (str): Athlete access token
+            after (int): Only activities starting after this Unix timestamp
+            before (int): Only activities starting before this Unix timestamp
+            page (int): 1-based page number
+            per_page (int): Page size
+
+        Returns:
+            list: Activity summaries; empty once past the last page
+        """
+        return self._get("/athlete/activities", token, params={
+            "before": before,
+            "after": after,
+            "per_page": per_page,
+            "page": page,
+            "include_all_efforts": True
+        })
+
+    def get_activity(self, token, activity_id):
+        """
+        Returns an activity's detail, including its segment_efforts.
+
+        Args:
+            token (str): Athlete access token
+            activity_id (int): Strava activity ID
+        """
+        return self._get(f"/activities/{activity_id}", token)
+
+    def get_segment(self, token, segment_id):
+        """
+        Returns a segment's metadata.
+
+        Args:
+            token (str): Any valid access token
+            segment_id (int): Strava segment ID
+        """
+        return self._get(f"/segments/{segment_id}", token)
+
+    def exchange_code(self, code):
+        """
+        Exchanges an OAuth authorization code for the athlete's tokens.
+
+        Returns:
+            dict: access_token, refresh_token, expires_at and the athlete summary
+        """
+        return self._token_request({'code': code, 'grant_type': 'authorization_code'})
+
+    def refresh_token(self, refresh_token):
+        """
+        Trades a refresh token for a new access token.
+
+        Returns:
+            dict: access_token, refresh_token and expires_at
+        """
+        return self._token_request({'refresh_token': refresh_token, 'grant_type': 'refresh_token'})
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_strava_client(client_id=None, client_secret=None):
+    """
+    Returns the process-wide client for these credentials, so every caller
+    reuses the same connection pool.
+    """
+    key = (client_id, client_secret)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = StravaClient(
+                client_id, client_secret,
+                # Point these at a local stand-in (see fake_strava_server.py) for offline runs
+                api_base=os.getenv("STRAVA_API_BASE", STRAVA_API_BASE),
+                oauth_base=os.getenv("STRAVA_OAUTH_BASE", STRAVA_OAUTH_BASE),
+                timeout=float(os.getenv("STRAVA_HTTP_TIMEOUT", 10)),
+                pool_size=int(os.getenv("STRAVA_HTTP_POOL_SIZE", 10))
+            )
+        return _clients[key]
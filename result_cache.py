@@ -0,0 +1,156 @@
+# result_cache.py
+
+"""
+In-process cache for scoreboard and leaderboard results.
+
+Standings only change when the pipeline commits new efforts, and every commit
+bumps the single-row `data_version` table. Cached results are tagged with the
+version they were computed at and are served until the version moves on. The
+version itself is re-read at most once every `version_ttl` seconds, so cache
+hits inside that window never touch the database.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Versioned result cache with bounded LRU eviction for per-segment entries.
+    Leaderboard pages get an LRU of their own, so requests for many different
+    cursors cannot evict the whole leaderboards.
+
+    Args:
+        max_segments (int): Leaderboards kept before the least recently used is evicted
+        version_ttl (float): Seconds a data version read is trusted before re-checking
+        enabled (bool): When False every lookup computes straight from the database
+        max_pages (int): Leaderboard pages kept before the least recently used is evicted
+    """
+
+    def __init__(self, max_segments=64, version_ttl=15, enabled=True, max_pages=256):
+        self.max_segments = max_segments
+        self.max_pages = max_pages
+        self.version_ttl = version_ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_read_at = 0.0
+        self._shared = {}                 # key -> (version, value); scoreboard, segment list
+        self._segments = OrderedDict()    # segment_id -> (version, value), LRU order
+        self._pages = OrderedDict()       # (segment_id, cursor, limit) -> (version, value), LRU order
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.version_reads = 0
+
+    def data_version(self):
+        """
+        Returns the current data version, re-reading it once the TTL has expired.
+
+        Returns:
+            int: Data version, or None if it could not be read (caching is bypassed)
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_read_at < self.version_ttl:
+                return self._version
+
+        try:
+            with get_db_connection() as conn, conn.cursor() as cur:
+                cur.execute("SELECT version FROM data_version WHERE id = 1")
+                row = cur.fetchone()
+        except psycopg2.Error as e:
+            logger.warning(f"Could not read data version, bypassing result cache: {e}")
+            return None
+
+        with self._lock:
+            self.version_reads += 1
+            self._version = row[0] if row else 0
+            self._version_read_at = now
+            return self._version
+
+    def expire_version(self):
+        """Makes the next lookup re-read the data version instead of trusting the TTL."""
+        with self._lock:
+            self._version_read_at = 0.0
+
+    def _lookup(self, store, key, compute, max_size=None):
+        if not self.enabled:
+            return compute()
+
+        version = self.data_version()
+        if version is None:
+            with self._lock:
+                self.misses += 1
+            return compute()
+
+        with self._lock:
+            entry = store.get(key)
+            if entry is not None and entry[0] == version:
+                if max_size is not None:
+                    store.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            store[key] = (version, value)
+            if max_size is not None:
+                store.move_to_end(key)
+                while len(store) > max_size:
+                    store.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def get_scoreboard(self, compute):
+        """Returns the cached scoreboard, calling compute() on a miss."""
+        return self._lookup(self._shared, "scoreboard", compute)
+
+    def get_segments(self, compute):
+        """Returns the cached segment list, calling compute() on a miss."""
+        return self._lookup(self._shared, "segments", compute)
+
+    def get_leaderboard(self, segment_id, compute):
+        """Returns the cached leaderboard for one segment, calling compute() on a miss."""
+        return self._lookup(self._segments, segment_id, compute, self.max_segments)
+
+    def get_leaderboard_page(self, segment_id, cursor, limit, compute):
+        """Returns one cached leaderboard page, calling compute() on a miss."""
+        return self._lookup(self._pages, (segment_id, cursor, limit), compute, self.max_pages)
+
+    def clear(self):
+        """Drops every cached result and forces the next lookup to re-read the version."""
+        with self._lock:
+            self._shared.clear()
+            self._segments.clear()
+            self._pages.clear()
+            self._version = None
+
+    def stats(self):
+        """Returns hit/miss counters and occupancy for tuning."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "data_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "version_reads": self.version_reads,
+                "cached_segments": len(self._segments),
+                "max_segments": self.max_segments,
+                "cached_pages": len(self._pages),
+                "max_pages": self.max_pages,
+                "version_ttl": self.version_ttl,
+            }
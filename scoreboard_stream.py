@@ -0,0 +1,166 @@
+# scoreboard_stream.py
+
+"""
+Live scoreboard updates over Server-Sent Events.
+
+A single listener thread per web worker holds a dedicated connection that
+LISTENs on the data_version channel. When the pipeline commits a new version,
+the thread scores the segments once and hands the result to every connected
+/scoreboard/stream client, so the number of viewers never multiplies the
+scoring queries. The thread is started by the first subscriber.
+"""
+
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from decimal import Decimal
+
+import psycopg2
+
+from database import open_connection, DATA_VERSION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    # SUM() comes back as numeric; team scores are whole numbers
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def format_event(event, data, event_id=None):
+    """Returns one SSE message; data is sent as a single JSON line."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=_json_default)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class ScoreboardBroadcaster:
+    """
+    Fans scoreboard updates out to SSE subscribers.
+
+    Args:
+        compute (callable): Returns (flags, winners), e.g. calculate_segment_results
+        heartbeat (float): Seconds between keep-alive comments on an idle stream,
+            so proxies do not close it
+        queue_size (int): Updates buffered per client; a client that falls
+            further behind only gets the newest ones
+        reconnect_delay (float): Seconds to wait before re-opening a lost listener connection
+    """
+
+    def __init__(self, compute, heartbeat=15, queue_size=4, reconnect_delay=5):
+        self.compute = compute
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.latest = None
+        self.broadcasts = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_listener(self):
+        """Starts the listener thread if it is not running in this process."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name="scoreboard-listener", daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = open_connection()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {DATA_VERSION_CHANNEL}")
+                logger.info(f"Listening for {DATA_VERSION_CHANNEL} notifications")
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    versions = [n.payload for n in conn.notifies]
+                    conn.notifies.clear()
+                    if versions:
+                        # Several commits in a burst are scored once, at the newest version
+                        version = versions[-1]
+                        self.publish(int(version) if version.isdigit() else version)
+            except psycopg2.Error as e:
+                logger.warning(f"Scoreboard listener lost its connection, reconnecting: {e}")
+            except Exception as e:
+                logger.error(f"Scoreboard listener failed, restarting: {e}")
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+            time.sleep(self.reconnect_delay)
+
+    def publish(self, version):
+        """
+        Scores the segments once and queues the result for every subscriber.
+        With no subscribers nothing is scored; the next client's page was
+        rendered from current data anyway.
+        """
+        with self._lock:
+            if not self._subscribers:
+                # Nothing older than this version may be replayed to the next client
+                self.latest = None
+                return
+        flags, winners = self.compute()
+        update = {"version": version, "flags": flags, "winners": winners}
+        with self._lock:
+            self.latest = update
+            self.broadcasts += 1
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(update)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+        logger.info(f"Pushed scoreboard version {version} to {len(subscribers)} clients")
+
+    def stream(self):
+        """
+        Yields SSE messages for one client until it disconnects: the newest
+        update already broadcast (if any), then each new one, with heartbeat
+        comments in between.
+        """
+        self.ensure_listener()
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(q)
+            latest = self.latest
+        try:
+            yield f"retry: {int(self.reconnect_delay * 1000)}\n\n"
+            if latest is not None:
+                yield format_event("scoreboard", latest, latest["version"])
+            while True:
+                try:
+                    update = q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event("scoreboard", update, update["version"])
+        finally:
+            with self._lock:
+                self._subscribers.discard(q)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "broadcasts": self.broadcasts,
+                "version": self.latest["version"] if self.latest else None,
+                "listening": self._thread is not None and self._thread.is_alive(),
+            }
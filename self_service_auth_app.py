@@ -11,6 +11,9 @@ import os
 from dotenv import load_dotenv
 import secrets
 
+from utils.rate_limiter import RateLimitExceeded
+from utils.strava_client import get_strava_client
+
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
@@ -61,17 +64,14 @@ def callback():
         return "Authorization failed", 400
    
     # Exchange code for tokens
-    response = requests.post("https://www.strava.com/oauth/token", data={
-        'client_id': CLIENT_ID,
-        'client_secret': CLIENT_SECRET,
-        'code': code,
-        'grant_type': 'authorization_code'
-    })
-   
-    if response.status_code != 200:
+    try:
+        tokens = get_strava_client(CLIENT_ID, CLIENT_SECRET).exchange_code(code)
+    except requests.HTTPError:
         return "Token exchange failed", 400
-   
-    tokens = response.json()
+    except requests.RequestException:
+        return "Token exchange failed: Strava could not be reached.", 502
+    except RateLimitExceeded:
+        return "Token exchange failed: Strava's rate limit is used up, try again later.", 503
    
     # Store in database
     conn = get_db_connection()
@@ -0,0 +1,9 @@
+#!/bin/sh
+# App Service startup command (set by the deploy workflow): bring the schema
+# up to date, then serve. migrate.py takes an advisory lock, so instances
+# starting together apply each migration once.
+set -e
+python migrate.py
+# Each /scoreboard/stream client holds a thread for as long as it is connected
+exec gunicorn --bind=0.0.0.0:${PORT:-8000} --timeout 600 \
+    --worker-class gthread --threads ${GUNICORN_THREADS:-16} app:app
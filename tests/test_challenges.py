@@ -0,0 +1,56 @@
+# tests/test_challenges.py
+
+import unittest
+
+from utils.challenges import ChallengeIndex
+
+BASE = (1, 2)
+
+
+class ChallengeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # 10 open for [100, 200), 20 for [150, 300), 30 for [300, 400); 40 is empty
+        self.index = ChallengeIndex(BASE, [(10, 100, 200), (20, 150, 300), (30, 300, 400), (40, 500, 500)])
+
+    def test_segments_at(self):
+        cases = [
+            (0, {1, 2}),
+            (99, {1, 2}),
+            (100, {1, 2, 10}),          # starts_at is inside the window
+            (150, {1, 2, 10, 20}),
+            (199, {1, 2, 10, 20}),
+            (200, {1, 2, 20}),          # ends_at is not
+            (300, {1, 2, 30}),
+            (400, {1, 2}),
+            (500, {1, 2}),
+            (10 ** 10, {1, 2}),
+        ]
+        for timestamp, expected in cases:
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(self.index.segments_at(timestamp), frozenset(expected))
+
+    def test_matches_scanning_every_window(self):
+        windows = [(10, 100, 200), (20, 150, 300), (30, 300, 400), (10, 350, 450)]
+        index = ChallengeIndex(BASE, windows)
+        for timestamp in range(50, 500):
+            expected = set(BASE) | {segment_id for segment_id, starts_at, ends_at in windows
+                                    if starts_at <= timestamp < ends_at}
+            self.assertEqual(index.segments_at(timestamp), expected, timestamp)
+
+    def test_equal_sets_are_shared(self):
+        self.assertIs(self.index.segments_at(0), self.index.segments_at(450))
+        self.assertIs(self.index.segments_at(0), self.index.base)
+
+    def test_challenge_segment_ids(self):
+        index = ChallengeIndex(BASE, [(20, 150, 300), (10, 100, 200), (20, 400, 500)])
+        self.assertEqual(index.challenge_segment_ids, [10, 20])
+        self.assertEqual(ChallengeIndex(BASE).challenge_segment_ids, [])
+
+    def test_no_windows(self):
+        index = ChallengeIndex(BASE)
+        self.assertEqual(index.segments_at(123), frozenset(BASE))
+
+
+if __name__ == "__main__":
+    unittest.main()
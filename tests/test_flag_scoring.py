@@ -0,0 +1,271 @@
+# tests/test_flag_scoring.py
+
+"""
+Checks the set-based FLAG_SCORING_QUERY against the per-row Python loop it
+replaced, on synthetic efforts with tied times and Dub segments.
+
+The loop is kept below exactly as calculate_flags ran it. Later changes are
+checked against it one at a time: where a change applies, the loop gets the
+input that change says it should see, and nothing about the loop itself is
+edited.
+
+Needs a Postgres reachable through the usual DB_* variables; each run works in
+a throwaway schema and drops it afterwards. Skipped when DB_HOST is not set.
+
+    DB_HOST=... DB_NAME=... DB_USER=... python -m pytest -q tests
+"""
+
+import os
+import random
+import unittest
+
+TEAMS = ("North", "South", "STP")
+
+
+def original_calculate_flags(segment_owners, segment_ids, efforts_by_segment):
+    """
+    calculate_flags before scoring moved into SQL, with its queries replaced by
+    their results. Only the winner bookkeeping is added, so the result can be
+    compared per segment.
+
+    Args:
+        segment_owners (dict): segment_id -> owner_team, as read from segment_teams
+        segment_ids (list): Segments with at least one effort
+        efforts_by_segment (dict): segment_id -> [{"elapsed_time", "team_name"}] in
+            the order the effort query returned them (stored order)
+
+    Returns:
+        tuple: (flags, winners) where winners maps segment_id to
+        (winning team, team score, flags awarded)
+    """
+    flags = {"North": 0, "South": 0, "STP": 0}
+    winners = {}
+
+    for segment_id in segment_ids:
+        owner_team = segment_owners.get(segment_id)
+        if not owner_team:
+            continue
+
+        all_efforts = efforts_by_segment.get(segment_id, [])
+        if not all_efforts:
+            continue
+
+        if owner_team == "Dub":
+            participation = {}
+            for effort in all_efforts:
+                team = effort["team_name"]
+                if team:
+                    participation[team] = participation.get(team, 0) + 1
+
+            if participation:
+                winning_team = max(participation, key=participation.get)
+                if winning_team in flags:
+                    flags[winning_team] += 2
+                winners[segment_id] = (winning_team, participation[winning_team], 2)
+
+        else:
+            sorted_efforts = sorted(all_efforts, key=lambda x: x["elapsed_time"])
+            num_runners = len(sorted_efforts)
+            team_points = {}
+
+            for i, effort in enumerate(sorted_efforts):
+                team = effort["team_name"]
+                if team:
+                    points = num_runners - i
+                    team_points[team] = team_points.get(team, 0) + points
+
+            if team_points:
+                winning_team = max(team_points, key=team_points.get)
+                if winning_team == owner_team:
+                    flags[winning_team] += 1
+                else:
+                    flags[winning_team] += 2
+                winners[segment_id] = (winning_team, team_points[winning_team],
+                                       1 if winning_team == owner_team else 2)
+
+    return flags, winners
+
+
+def original_inputs(stored, athletes, owners, best_only=False):
+    """
+    Builds what the original loop's queries returned: efforts joined to
+    athletes, in stored order.
+
+    Args:
+        stored (list): (effort id, athlete id, segment id, elapsed time) rows
+        athletes (dict): athlete id -> team name
+        owners (dict): segment id -> owner team
+        best_only (bool): Keep only each athlete's best effort (ties on time go
+            to the earlier effort) on standard segments, as scoring has since the
+            athlete_segment_best change; Dub segments still count every effort
+
+    Returns:
+        tuple: Arguments for original_calculate_flags
+    """
+    rows = sorted(row for row in stored if row[1] in athletes)
+    if best_only:
+        best = {}
+        for effort_id, athlete_id, segment_id, elapsed_time in rows:
+            key = (athlete_id, segment_id)
+            if key not in best or (elapsed_time, effort_id) < best[key]:
+                best[key] = (elapsed_time, effort_id)
+        keep = {effort_id for _, effort_id in best.values()}
+        rows = [row for row in rows if owners.get(row[2]) == "Dub" or row[0] in keep]
+
+    efforts_by_segment = {}
+    for _, athlete_id, segment_id, elapsed_time in rows:
+        efforts_by_segment.setdefault(segment_id, []).append(
+            {"elapsed_time": elapsed_time, "team_name": athletes[athlete_id]})
+    segment_ids = sorted({row[2] for row in stored})
+    return owners, segment_ids, efforts_by_segment
+
+
+@unittest.skipUnless(os.getenv("DB_HOST"), "DB_HOST is not set")
+class FlagScoringTest(unittest.TestCase):
+
+    schema = f"cts_test_flags_{os.getpid()}"
+
+    @classmethod
+    def setUpClass(cls):
+        import psycopg2.extras
+        import app
+        import database
+        import migrate
+        import pipeline
+
+        cls.app = app
+        cls.pipeline = pipeline
+        cls.extras = psycopg2.extras
+        cls.conn = database.open_connection()
+        with cls.conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {cls.schema}")
+            cur.execute(f"SET search_path TO {cls.schema}")
+        cls.conn.commit()
+        migrate.apply_migrations(cls.conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.rollback()
+        with cls.conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {cls.schema} CASCADE")
+        cls.conn.commit()
+        cls.conn.close()
+
+    def load(self, athletes, owners, efforts):
+        """
+        Replaces the tables' contents. Efforts are stored one at a time in the
+        order given, through the pipeline's insert step, so their ids (Dub
+        arrival order) follow the list and athlete_segment_best is filled as in
+        production.
+
+        Args:
+            athletes (dict): athlete id -> team name
+            owners (dict): segment id -> owner team
+            efforts (list): (athlete id, segment id, elapsed time) in arrival order
+
+        Returns:
+            list: (effort id, athlete id, segment id, elapsed time) as stored
+        """
+        with self.conn.cursor(cursor_factory=self.extras.RealDictCursor) as cur:
+            cur.execute("""
+                TRUNCATE segment_efforts, athlete_segment_best, processed_activities,
+                         athlete_sync_state, segment_metadata, athletes, segment_teams
+                RESTART IDENTITY
+            """)
+            self.extras.execute_values(
+                cur, "INSERT INTO athletes (athlete_id, athlete_name, team_name) VALUES %s",
+                [(athlete_id, f"Athlete {athlete_id}", team) for athlete_id, team in athletes.items()])
+            self.extras.execute_values(
+                cur, "INSERT INTO segment_teams (segment_id, owner_team, segment_name) VALUES %s",
+                [(segment_id, owner, f"Segment {segment_id}") for segment_id, owner in owners.items()])
+            for activity_id, (athlete_id, segment_id, elapsed_time) in enumerate(efforts, start=1):
+                row = (f"Athlete {athlete_id}", athlete_id, segment_id, f"Segment {segment_id}",
+                       activity_id, elapsed_time, "2025-06-01 08:00:00")
+                self.pipeline.store_efforts(cur, athlete_id, row[0], [row], None)
+            cur.execute("SELECT id, athlete_id, segment_id, elapsed_time FROM segment_efforts ORDER BY id")
+            stored = [tuple(row.values()) for row in cur.fetchall()]
+        self.conn.commit()
+        return stored
+
+    def score(self, policy):
+        with self.conn.cursor(cursor_factory=self.extras.RealDictCursor) as cur:
+            cur.execute(self.app.flag_scoring_query(policy))
+            rows = cur.fetchall()
+        self.conn.commit()
+        return {row["segment_id"]: (row["winning_team"], int(row["team_score"]), row["flags_awarded"])
+                for row in rows}
+
+    def random_scenario(self, seed, repeat_efforts, distinct_times):
+        """
+        Athletes across the teams (some teamless, some never registered), owned,
+        Dub and unowned segments, and efforts on them.
+
+        Args:
+            seed (int): Random seed
+            repeat_efforts (bool): Allow several efforts per athlete on a standard segment
+            distinct_times (bool): No two efforts on a standard segment share a time
+        """
+        rng = random.Random(seed)
+        athletes = {athlete_id: rng.choice(TEAMS + ("",)) for athlete_id in range(1, 31)}
+        owners = {segment_id: rng.choice(TEAMS + ("Dub", "")) for segment_id in range(100, 112)}
+        efforts = []
+        for segment_id in list(owners) + [999]:
+            runners = rng.sample(range(1, 35), rng.randint(1, 20))
+            if repeat_efforts or owners.get(segment_id) == "Dub":
+                runners += rng.choices(runners, k=rng.randint(0, 10))
+            times = rng.sample(range(100, 400), len(runners)) if distinct_times else \
+                [rng.randint(100, 104) for _ in runners]
+            efforts += [(athlete_id, segment_id, time) for athlete_id, time in zip(runners, times)]
+        rng.shuffle(efforts)
+        return athletes, owners, efforts
+
+    def test_matches_original_loop(self):
+        # One effort per athlete and no equal times: nothing changed since the loop applies
+        for seed in range(6):
+            athletes, owners, efforts = self.random_scenario(seed, repeat_efforts=False, distinct_times=True)
+            stored = self.load(athletes, owners, efforts)
+            _, expected = original_calculate_flags(*original_inputs(stored, athletes, owners))
+            for policy in self.app.TIE_POLICIES:
+                with self.subTest(seed=seed, policy=policy):
+                    self.assertEqual(self.score(policy), expected)
+
+    def test_best_effort_per_athlete(self):
+        # Standard segments rank each athlete once; strict breaks equal times by
+        # stored order, which is what the loop's stable sort did
+        for seed in range(6):
+            athletes, owners, efforts = self.random_scenario(seed, repeat_efforts=True, distinct_times=False)
+            stored = self.load(athletes, owners, efforts)
+            _, expected = original_calculate_flags(*original_inputs(stored, athletes, owners, best_only=True))
+            with self.subTest(seed=seed):
+                self.assertEqual(self.score("strict"), expected)
+
+    def test_tie_policies(self):
+        athletes = {1: "North", 2: "North", 3: "South", 4: "South", 5: ""}
+        owners = {10: "North", 20: "Dub"}
+        efforts = [
+            (1, 10, 100), (3, 10, 100), (4, 10, 105), (2, 10, 110),
+            # A slower second run does not count; the teamless athlete only adds a runner
+            (1, 10, 120), (5, 10, 130),
+            # Dub: two efforts each, South arrives first
+            (3, 20, 300), (1, 20, 200), (2, 20, 250), (4, 20, 400), (5, 20, 100),
+        ]
+        stored = self.load(athletes, owners, efforts)
+
+        expected = {
+            # Points 5,5,3,2,1: North 5+2, South 5+3
+            "shared": {10: ("South", 8, 2), 20: ("South", 2, 2)},
+            # Points 5,5,4,3,2: North 5+3, South 5+4
+            "dense": {10: ("South", 9, 2), 20: ("South", 2, 2)},
+            # Points 5,4,3,2,1: 7 each, North finished first and defends
+            "strict": {10: ("North", 7, 1), 20: ("South", 2, 2)},
+        }
+        for policy, results in expected.items():
+            with self.subTest(policy=policy):
+                self.assertEqual(self.score(policy), results)
+        # The default flag policy is the loop's own tie-break
+        _, original = original_calculate_flags(*original_inputs(stored, athletes, owners, best_only=True))
+        self.assertEqual(expected[self.app.FLAG_TIE_POLICY], original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+# tests/test_leaderboard_page.py
+
+"""
+Walks keyset leaderboard pages and checks every rank and point against a
+ranking of the whole segment at once, for each tie policy.
+
+The page query runs on an in-memory SQLite table standing in for
+athlete_segment_best (SQLite has the window functions and row comparisons the
+query uses), so no database server is needed.
+
+    python -m pytest -q tests
+"""
+
+import random
+import re
+import sqlite3
+import unittest
+from unittest import mock
+
+import app
+
+
+class SqliteConnection:
+    """
+    Just enough of a psycopg2 connection for get_leaderboard_page: `with`
+    support, and cursors that take %s / %(name)s placeholders and return dict
+    rows like RealDictCursor.
+    """
+
+    def __init__(self, db, policy):
+        self.db = db
+        self.policy = policy
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return SqliteCursor(self)
+
+
+class SqliteCursor:
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cur = conn.db.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cur.close()
+        return False
+
+    def execute(self, sql, params=()):
+        if sql == app.LEADERBOARD_PAGE_QUERY:
+            sql = app.leaderboard_page_query(self.conn.policy)
+        sql = re.sub(r"%\((\w+)\)s", r":\1", sql).replace("%s", "?")
+        self.cur.execute(sql, params)
+
+    def fetchone(self):
+        row = self.cur.fetchone()
+        return None if row is None else self._dict(row)
+
+    def fetchall(self):
+        return [self._dict(row) for row in self.cur.fetchall()]
+
+    def _dict(self, row):
+        return {column[0]: value for column, value in zip(self.cur.description, row)}
+
+
+def expected_ranks(times, policy):
+    """
+    Ranks a whole segment at once from the policy's definition.
+
+    Args:
+        times (list): (best_time, best_effort_id) of every athlete, in any order
+        policy (str): Key of app.TIE_POLICIES
+
+    Returns:
+        list: (best_effort_id, rank, points) fastest first
+    """
+    ordered = sorted(times)
+    total = len(ordered)
+    ranks = []
+    for position, (best_time, best_effort_id) in enumerate(ordered, start=1):
+        if policy == "strict":
+            rank = position
+        elif policy == "shared":
+            rank = 1 + sum(1 for t, _ in ordered if t < best_time)
+        else:
+            rank = 1 + len({t for t, _ in ordered if t < best_time})
+        ranks.append((best_effort_id, rank, total - rank + 1))
+    return ranks
+
+
+class LeaderboardPageTest(unittest.TestCase):
+
+    segment_id = 7
+
+    def setUp(self):
+        self.db = sqlite3.connect(":memory:")
+        self.db.executescript("""
+            CREATE TABLE athlete_segment_best (
+                athlete_id INTEGER, athlete_name TEXT, segment_id INTEGER, segment_name TEXT,
+                best_time INTEGER, best_effort_id INTEGER
+            );
+            CREATE TABLE data_version (id INTEGER PRIMARY KEY, version INTEGER);
+            INSERT INTO data_version VALUES (1, 1);
+        """)
+        self.policy = "shared"
+        patcher = mock.patch.object(app, "get_db_connection",
+                                    lambda: SqliteConnection(self.db, self.policy))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.db.close)
+
+    def load(self, times):
+        self.db.execute("DELETE FROM athlete_segment_best")
+        self.db.executemany(
+            "INSERT INTO athlete_segment_best VALUES (?, ?, ?, 'Segment', ?, ?)",
+            [(athlete_id, f"Athlete {athlete_id}", self.segment_id, best_time, best_effort_id)
+             for athlete_id, (best_time, best_effort_id) in enumerate(times, start=1)])
+
+    def walk(self, limit):
+        """Every row of the segment, read page by page."""
+        rows, cursor = [], None
+        while True:
+            page = app.get_leaderboard_page(self.segment_id, cursor, limit)
+            rows += page["efforts"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return rows
+
+    def test_pages_match_full_ranking(self):
+        rng = random.Random(2025)
+        for policy in app.TIE_POLICIES:
+            self.policy = policy
+            for case in range(200):
+                # Few distinct times so ties often straddle a page boundary
+                runners = rng.randint(1, 40)
+                best_effort_ids = rng.sample(range(1, 1000), runners)
+                times = [(rng.randint(100, 100 + rng.randint(0, 10)), best_effort_id)
+                         for best_effort_id in best_effort_ids]
+                limit = rng.randint(1, 12)
+                self.load(times)
+                with self.subTest(policy=policy, case=case, limit=limit):
+                    rows = self.walk(limit)
+                    self.assertEqual([(row["best_effort_id"], row["rank"], row["points"]) for row in rows],
+                                     expected_ranks(times, policy))
+
+    def test_stale_cursor(self):
+        self.load([(100, 1), (101, 2), (102, 3)])
+        cursor = app.get_leaderboard_page(self.segment_id, None, 1)["next_cursor"]
+        self.db.execute("UPDATE data_version SET version = 2")
+        with self.assertRaises(app.StaleCursorError):
+            app.get_leaderboard_page(self.segment_id, cursor, 1)
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = (12, 345, 6789, 10, 50)
+        cursor = app.encode_cursor(*values)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(app.decode_cursor(cursor), values)
+
+    def test_empty_cursor_is_first_page(self):
+        self.assertEqual(app.decode_cursor(None), app.FIRST_PAGE)
+        self.assertEqual(app.decode_cursor(""), app.FIRST_PAGE)
+
+    def test_malformed(self):
+        for cursor in ("not base64!", "////", app.encode_cursor(1, 2, 3, 4, 5) + "x",
+                       "MToyOjM",                      # "1:2:3", too few fields
+                       "MTphOjM6NDo1"):                # "1:a:3:4:5"
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                app.decode_cursor(cursor)
+
+    def test_stale_cursor_error_is_a_value_error(self):
+        # Callers that only catch ValueError still reject the cursor
+        self.assertTrue(issubclass(app.StaleCursorError, ValueError))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+# tests/test_leaderboard_scraper.py
+
+import unittest
+
+from leaderboard_scraper import parse_leaderboard, score_ties
+
+
+def page(*rows, table=True):
+    body = "".join(
+        "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows)
+    results = f"<table><thead><tr><th>Rank</th></tr></thead><tbody>{body}</tbody></table>" if table else ""
+    return f"<html><body><div id='results'>{results}</div></body></html>"
+
+
+class ParseLeaderboardTest(unittest.TestCase):
+
+    def test_rows(self):
+        html = page(
+            ("1", "<a href='/athletes/1'> Ann  <span>🎩</span></a>", "Jun 1, 2025", "9.1", "180", "4:05"),
+            ("2", "Bob 🧢", "Jun 2, 2025", "9.0", "", "4:05"),
+        )
+        rows, row_count = parse_leaderboard(html)
+        self.assertEqual(rows, [("Ann🎩", "Jun 1, 2025", "4:05"), ("Bob 🧢", "Jun 2, 2025", "4:05")])
+        self.assertEqual(row_count, 2)
+
+    def test_short_rows_are_counted_but_skipped(self):
+        html = page(("1", "Ann", "Jun 1, 2025", "4:05"),
+                    ("2", "Bob", "Jun 2, 2025", "9.0", "", "4:10"))
+        rows, row_count = parse_leaderboard(html)
+        self.assertEqual(rows, [("Bob", "Jun 2, 2025", "4:10")])
+        self.assertEqual(row_count, 2)
+
+    def test_no_results_table(self):
+        self.assertEqual(parse_leaderboard(page(table=False)), (None, 0))
+        self.assertEqual(parse_leaderboard(""), (None, 0))
+
+
+class ScoreTiesTest(unittest.TestCase):
+
+    def test_ties_score_by_place_in_group(self):
+        entries = [("a", "🎩", "4:05"), ("b", "🧢", "4:05"), ("c", "🎩", "4:05"),
+                   ("d", "⛑️", "4:10"), ("e", "⛑️", "4:20"), ("f", "🎩", "4:20")]
+        # 4:05: b 1, c 2; 4:20: f 1
+        self.assertEqual(score_ties(entries), "🎩-3\n🧢-1")
+
+    def test_no_ties(self):
+        self.assertEqual(score_ties([("a", "🎩", "4:05"), ("b", "🧢", "4:06")]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
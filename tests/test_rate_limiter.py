@@ -0,0 +1,79 @@
+# tests/test_rate_limiter.py
+
+import unittest
+from unittest import mock
+
+from utils import rate_limiter
+from utils.rate_limiter import DAILY_WINDOW, SHORT_WINDOW, RateLimiter, RateLimitExceeded
+
+# 10:05 UTC on some day: 5 minutes into a short window
+NOW = 1000 * DAILY_WINDOW + 10 * 3600 + 5 * 60
+
+
+class RateLimiterWaitTest(unittest.TestCase):
+
+    def limiter(self, **kwargs):
+        limiter = RateLimiter(short_limit=100, daily_limit=1000, margin=5, **kwargs)
+        limiter._roll_windows(NOW)
+        return limiter
+
+    def test_budget_left(self):
+        limiter = self.limiter()
+        limiter.short_used, limiter.daily_used = 94, 994
+        self.assertEqual(limiter._window_wait(NOW), 0)
+
+    def test_short_window_used_up(self):
+        limiter = self.limiter()
+        limiter.short_used = 95
+        self.assertEqual(limiter._window_wait(NOW), SHORT_WINDOW - 5 * 60)
+
+    def test_daily_window_used_up(self):
+        # The daily reset wins even when the short window is spent too
+        limiter = self.limiter()
+        limiter.short_used, limiter.daily_used = 100, 995
+        self.assertEqual(limiter._window_wait(NOW), DAILY_WINDOW - (10 * 3600 + 5 * 60))
+
+    def test_windows_roll_over(self):
+        limiter = self.limiter()
+        limiter.short_used, limiter.daily_used = 100, 500
+        limiter._roll_windows(NOW + SHORT_WINDOW)
+        self.assertEqual((limiter.short_used, limiter.daily_used), (0, 500))
+        limiter._roll_windows(NOW + DAILY_WINDOW)
+        self.assertEqual((limiter.short_used, limiter.daily_used), (0, 0))
+
+    def test_acquire_raises_past_max_wait(self):
+        limiter = self.limiter(max_wait=SHORT_WINDOW)
+        limiter.daily_used = 995
+        with mock.patch.object(rate_limiter.time, "time", return_value=NOW), \
+                mock.patch.object(rate_limiter.time, "sleep") as sleep:
+            with self.assertRaises(RateLimitExceeded) as raised:
+                limiter.acquire()
+        self.assertEqual(raised.exception.retry_after, DAILY_WINDOW - (10 * 3600 + 5 * 60))
+        sleep.assert_not_called()
+
+    def test_acquire_waits_within_max_wait(self):
+        limiter = self.limiter(max_wait=SHORT_WINDOW)
+        limiter.short_used = 95
+        clock = [NOW]
+
+        def sleep(seconds):
+            clock[0] += seconds
+
+        with mock.patch.object(rate_limiter.time, "time", lambda: clock[0]), \
+                mock.patch.object(rate_limiter.time, "sleep", side_effect=sleep) as slept:
+            limiter.acquire()
+        slept.assert_called_once_with(SHORT_WINDOW - 5 * 60)
+        self.assertEqual((limiter.short_used, limiter.daily_used), (1, 1))
+
+    def test_headers(self):
+        limiter = self.limiter()
+        self.assertTrue(limiter.update_from_headers({"X-RateLimit-Limit": "200,2000",
+                                                     "X-RateLimit-Usage": "12,340"}))
+        self.assertEqual((limiter.short_limit, limiter.daily_limit), (200, 2000))
+        self.assertEqual((limiter.short_used, limiter.daily_used), (12, 340))
+        self.assertFalse(limiter.update_from_headers({"X-RateLimit-Limit": "200,2000"}))
+        self.assertFalse(limiter.update_from_headers({"X-RateLimit-Limit": "a,b", "X-RateLimit-Usage": "1,2"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# tests/test_result_cache.py
+
+import unittest
+from unittest import mock
+
+import psycopg2
+
+import result_cache
+from result_cache import ResultCache
+
+
+class FakeConnection:
+    """Answers the data_version query with whatever version the test set."""
+
+    def __init__(self, test):
+        self.test = test
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        self.test.reads += 1
+        if self.test.down:
+            raise psycopg2.OperationalError("database is down")
+
+    def fetchone(self):
+        return (self.test.version,)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.version, self.reads, self.down, self.now = 1, 0, False, 1000.0
+        patches = [mock.patch.object(result_cache, "get_db_connection", lambda: FakeConnection(self)),
+                   mock.patch.object(result_cache.time, "monotonic", lambda: self.now)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.cache = ResultCache(max_segments=2, version_ttl=15, max_pages=2)
+
+    def test_version_is_trusted_for_the_ttl(self):
+        self.assertEqual(self.cache.data_version(), 1)
+        self.version = 2
+        self.now += 14.9
+        self.assertEqual(self.cache.data_version(), 1)
+        self.assertEqual(self.reads, 1)
+        self.now += 0.1
+        self.assertEqual(self.cache.data_version(), 2)
+        self.assertEqual(self.reads, 2)
+
+    def test_expire_version(self):
+        self.cache.data_version()
+        self.version = 2
+        self.cache.expire_version()
+        self.assertEqual(self.cache.data_version(), 2)
+
+    def test_results_follow_the_version(self):
+        compute = mock.Mock(side_effect=["first", "second"])
+        self.assertEqual(self.cache.get_scoreboard(compute), "first")
+        self.assertEqual(self.cache.get_scoreboard(compute), "first")
+        # A new version inside the TTL is not seen yet
+        self.version = 2
+        self.assertEqual(self.cache.get_scoreboard(compute), "first")
+        self.now += 15
+        self.assertEqual(self.cache.get_scoreboard(compute), "second")
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_unreadable_version_bypasses_the_cache(self):
+        self.down = True
+        compute = mock.Mock(return_value="fresh")
+        self.assertIsNone(self.cache.data_version())
+        self.cache.get_scoreboard(compute)
+        self.cache.get_scoreboard(compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_pages_evict_separately(self):
+        self.cache.get_leaderboard(1, lambda: "board")
+        for cursor in ("a", "b", "c"):
+            self.cache.get_leaderboard_page(1, cursor, 50, lambda: cursor)
+        stats = self.cache.stats()
+        self.assertEqual((stats["cached_segments"], stats["cached_pages"], stats["evictions"]), (1, 2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+# tests/test_scoreboard_stream.py
+
+import queue
+import unittest
+from unittest import mock
+
+from scoreboard_stream import ScoreboardBroadcaster
+
+
+class PublishTest(unittest.TestCase):
+
+    def setUp(self):
+        self.compute = mock.Mock(return_value=({"North": 3}, []))
+        self.broadcaster = ScoreboardBroadcaster(self.compute, queue_size=2)
+
+    def test_no_subscribers_skips_scoring(self):
+        self.broadcaster.latest = {"version": 1}
+        self.broadcaster.publish(2)
+        self.compute.assert_not_called()
+        self.assertIsNone(self.broadcaster.latest)
+
+    def test_subscribers_get_the_newest_updates(self):
+        q = queue.Queue(maxsize=2)
+        self.broadcaster._subscribers.add(q)
+        for version in (1, 2, 3):
+            self.broadcaster.publish(version)
+        self.assertEqual(self.compute.call_count, 3)
+        self.assertEqual([q.get_nowait()["version"] for _ in range(2)], [2, 3])
+        self.assertEqual(self.broadcaster.latest["version"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+# challenges.py
+
+from bisect import bisect_right
+
+
+class ChallengeIndex:
+    """
+    Sorted interval index of challenge windows.
+
+    The window boundaries split the timeline into elementary intervals in which
+    the set of open challenges does not change. The tracked segments of each
+    interval (the base segments plus every challenge open in it) are built once
+    as a frozenset, so a lookup is one bisect and allocates nothing.
+
+    Args:
+        base_segment_ids (iterable): Segments tracked at all times
+        windows (iterable): (segment_id, starts_at, ends_at) tuples; a challenge
+            is open for starts_at <= timestamp < ends_at
+    """
+
+    def __init__(self, base_segment_ids, windows=()):
+        self.base = frozenset(base_segment_ids)
+        self.windows = sorted((starts_at, ends_at, segment_id) for segment_id, starts_at, ends_at in windows
+                              if ends_at > starts_at)
+        self.boundaries = sorted({t for starts_at, ends_at, _ in self.windows for t in (starts_at, ends_at)})
+
+        # segments[i] covers boundaries[i] <= t < boundaries[i + 1]; identical sets share one object
+        memo = {frozenset(): self.base}
+        self.segments = []
+        for start in self.boundaries:
+            open_now = frozenset(segment_id for starts_at, ends_at, segment_id in self.windows
+                                 if starts_at <= start < ends_at)
+            if open_now not in memo:
+                memo[open_now] = self.base | open_now
+            self.segments.append(memo[open_now])
+
+    def segments_at(self, timestamp):
+        """
+        Returns:
+            frozenset: Segment IDs tracked for an activity at this Unix timestamp
+        """
+        i = bisect_right(self.boundaries, timestamp) - 1
+        if i < 0:
+            return self.base
+        return self.segments[i]
+
+    @property
+    def challenge_segment_ids(self):
+        """Every segment that has a challenge window, in window order."""
+        return list(dict.fromkeys(segment_id for _, _, segment_id in self.windows))
@@ -0,0 +1,197 @@
+# rate_limiter.py
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Strava budgets requests per 15 minutes (reset on the quarter hour) and per
+# day (reset at midnight UTC)
+SHORT_WINDOW = 15 * 60
+DAILY_WINDOW = 24 * 60 * 60
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised instead of waiting when a window resets further away than the
+    limiter's max_wait, e.g. once the daily budget is spent.
+
+    Attributes:
+        retry_after (float): Seconds until the window resets
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Strava rate budget used up for the next {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter shared by every Strava API caller in the process.
+
+    Two layers:
+      - a token bucket that paces requests (`rate` per second, up to `burst` at once)
+      - a model of Strava's 15-minute and daily windows, kept in sync with the
+        X-RateLimit-Limit / X-RateLimit-Usage headers of every response
+
+    Callers only block while the pacing bucket is empty or a window's budget
+    (less `margin` requests held back for in-flight calls) is used up, and then
+    only until that window resets. A reset more than `max_wait` seconds away
+    raises RateLimitExceeded instead, so the caller can give up on the work and
+    retry it in a later run.
+    """
+
+    def __init__(self, rate=10.0, burst=1, short_limit=100, daily_limit=1000, margin=5, max_wait=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.margin = margin
+        self.max_wait = max_wait
+        self.short_used = 0
+        self.daily_used = 0
+        self._short_window = None
+        self._daily_window = None
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _roll_windows(self, wall):
+        short_window = int(wall // SHORT_WINDOW)
+        daily_window = int(wall // DAILY_WINDOW)
+        if short_window != self._short_window:
+            self._short_window = short_window
+            self.short_used = 0
+        if daily_window != self._daily_window:
+            self._daily_window = daily_window
+            self.daily_used = 0
+
+    def _window_wait(self, wall):
+        """Seconds until the exhausted window (if any) resets."""
+        if self.daily_used >= self.daily_limit - self.margin:
+            return (self._daily_window + 1) * DAILY_WINDOW - wall
+        if self.short_used >= self.short_limit - self.margin:
+            return (self._short_window + 1) * SHORT_WINDOW - wall
+        return 0
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent, then records it against the budget.
+
+        Raises:
+            RateLimitExceeded: If the exhausted window resets more than max_wait seconds from now
+        """
+        while True:
+            with self._lock:
+                wall = time.time()
+                self._roll_windows(wall)
+                wait = self._window_wait(wall)
+                if self.max_wait is not None and wait > self.max_wait:
+                    raise RateLimitExceeded(wait)
+                if wait <= 0:
+                    self._refill(time.monotonic())
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.short_used += 1
+                        self.daily_used += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            if wait >= 1:
+                logger.warning(f"Strava rate budget used up, waiting {wait:.0f}s for the window to reset")
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """
+        Syncs the window model with Strava's rate limit headers.
+
+        The read-specific headers are preferred when present since they are the
+        tighter budget for the GETs the pipeline makes.
+
+        Returns:
+            bool: True if the headers were present and parsed
+        """
+        limit = headers.get("X-ReadRateLimit-Limit") or headers.get("X-RateLimit-Limit")
+        usage = headers.get("X-ReadRateLimit-Usage") or headers.get("X-RateLimit-Usage")
+        if not limit or not usage:
+            return False
+        try:
+            short_limit, daily_limit = (int(v) for v in limit.split(","))
+            short_used, daily_used = (int(v) for v in usage.split(","))
+        except ValueError:
+            logger.debug(f"Unparseable rate limit headers: {limit!r} / {usage!r}")
+            return False
+
+        with self._lock:
+            self._roll_windows(time.time())
+            self.short_limit, self.daily_limit = short_limit, daily_limit
+            self.short_used, self.daily_used = short_used, daily_used
+        return True
+
+    def on_rate_limited(self, headers=None):
+        """
+        Records a 429. Unless the headers show budget left in both windows,
+        nothing more is sent until the current window resets.
+
+        Returns:
+            bool: True if the window was marked as used up, False if the headers
+            show budget left (the 429 is not explained by the windows)
+        """
+        with self._lock:
+            self._roll_windows(time.time())
+        if headers is not None and self.update_from_headers(headers):
+            with self._lock:
+                if self._window_wait(time.time()) <= 0 and self.short_used < self.short_limit:
+                    return False
+        with self._lock:
+            self.short_used = max(self.short_used, self.short_limit)
+        return True
+
+    def call(self, send, *args, retries=3, **kwargs):
+        """
+        Sends a request through the limiter.
+
+        Waits for budget, records the usage headers of the response and, on a
+        429, waits for the window to reset (or backs off briefly if the headers
+        show budget left) and tries again, up to `retries` times.
+
+        Args:
+            send (callable): e.g. requests.get or Session.post
+            *args, **kwargs: Passed to send
+
+        Returns:
+            requests.Response: The last response, which may still be a 429
+
+        Raises:
+            RateLimitExceeded: If the budget would take longer than max_wait to come back
+        """
+        for attempt in range(retries + 1):
+            self.acquire()
+            response = send(*args, **kwargs)
+            self.update_from_headers(response.headers)
+            if response.status_code != 429 or attempt == retries:
+                return response
+            if self.on_rate_limited(response.headers):
+                logger.warning("Strava returned 429, waiting for the rate limit window to reset")
+            else:
+                backoff = min(60, 2 ** attempt)
+                logger.warning(f"Strava returned 429 with budget left, retrying in {backoff}s")
+                time.sleep(backoff)
+        return response
+
+
+# Process-wide budget for strava.com
+strava_limiter = RateLimiter(
+    rate=float(os.getenv("STRAVA_REQUESTS_PER_SECOND", 10)),
+    burst=int(os.getenv("STRAVA_REQUEST_BURST", 1)),
+    short_limit=int(os.getenv("STRAVA_LIMIT_15MIN", 100)),
+    daily_limit=int(os.getenv("STRAVA_LIMIT_DAILY", 1000)),
+    margin=int(os.getenv("STRAVA_RATE_MARGIN", 5)),
+    # Long enough to ride out a 15-minute window; a spent daily budget raises
+    max_wait=float(os.getenv("STRAVA_MAX_WAIT_SECONDS", SHORT_WINDOW))
+)